@@ -10,6 +10,14 @@ import joblib
 import os
 import base64
 
+from datos import RUTAS_DATOS, version_datos
+from regiones import (DIRECTORIO_GEOMETRIAS, RegionesCompartidas, centro_mapa, localidades_por_cp,
+                      nombre_provincia, particionar_geojson, ruta_geometria)
+from cache import CacheLRU
+from cubo import CuboKPIs
+from informes import FORMATOS, GestorInformes, version_datos_informe
+from graficos import cuantiles_por_grupo, figura_boxplot, figura_dispersion, figura_histograma, histograma
+
 
 # Configuración general de Streamlit
 st.set_page_config(
@@ -26,49 +34,104 @@ menu = st.sidebar.selectbox(
     ["Inicio", "Vista para Usuarios", "Vista para Clientes","Análisis Avanzado","Esquema de Base de Datos", "Contacto","About Us"]
 )
 
-# Función para cargar y limpiar datos
-@st.cache_data
-def cargar_datos(tipo):
-    try:
-        data_path = "inmuebles_alquilerconcp.csv" if tipo == "Alquiler" else "inmueblesventaconcp.csv"
-        data = pd.read_csv(data_path)
-        data.columns = data.columns.str.lower().str.strip()
-
-        # Convertir columnas a tipo numérico
-        columnas_numericas = ["precio", "superficie construida", "habitaciones", "baños", "consumo energético", "emisiones co2"]
-        for columna in columnas_numericas:
-            if columna in data.columns:
-                data[columna] = pd.to_numeric(data[columna], errors="coerce")
-        
-        # Verificar y limpiar la columna 'cp' si existe
-        if "cp" in data.columns:
-            data["cp"] = data["cp"].astype(str).str.extract(r'(\d{5})')[0]  # Extraer solo códigos válidos (5 dígitos)
-            data = data.dropna(subset=["cp"])  # Eliminar filas con 'cp' nulo
-        else:
-            st.warning("La columna 'cp' no está disponible en los datos. Algunas funcionalidades pueden estar limitadas.")
-            data["cp"] = None  # Añadir una columna vacía si no existe 'cp'
+# Caché LRU de figuras terminadas, compartida por todas las sesiones
+@st.cache_resource
+def cache_figuras():
+    return CacheLRU(max_entradas=256)
+
+# Particiones por provincia (datos_regiones/), compartidas por todas las sesiones
+@st.cache_resource
+def regiones_compartidas():
+    return RegionesCompartidas()
 
-        return data
+def provincias_publicadas(tipo):
+    # Si el CSV ha cambiado, el primer proceso que llega vuelve a particionarlo
+    try:
+        regiones = regiones_compartidas()
+        regiones.publicar_csv(tipo)
+        preparar_informe()  # Respaldo si el ETL no ha generado el informe de esta versión
+        return regiones.provincias(tipo)
     except FileNotFoundError:
-        st.error(f"No se encontró el archivo: {data_path}")
-        return pd.DataFrame()
-    except Exception as e:
-        st.error(f"Error al cargar los datos: {str(e)}")
-        return pd.DataFrame()
+        st.error(f"No se encontró el archivo: {RUTAS_DATOS[tipo]}")
+        return []
+
+# Solo se abren las particiones seleccionadas; con varias provincias se guarda la concatenación
+@st.cache_resource(max_entries=16)
+def cargar_regiones(tipo, provincias, version):
+    return regiones_compartidas().cargar(tipo, provincias)
+
+@st.cache_data(max_entries=16)
+def cargar_localidades(tipo, provincias, version):
+    return localidades_por_cp(cargar_regiones(tipo, provincias, version))
+
+# Cubo de KPIs (venta y alquiler) de una provincia, se reconstruye solo si cambia alguno de los CSV
+@st.cache_resource(max_entries=64)
+def cargar_cubo_provincia(provincia, version_venta, version_alquiler):
+    datasets = {
+        "Venta": cargar_regiones("Venta", (provincia,), version_venta) if version_venta else pd.DataFrame(),
+        "Alquiler": cargar_regiones("Alquiler", (provincia,), version_alquiler) if version_alquiler else pd.DataFrame(),
+    }
+    datasets = {tipo: data for tipo, data in datasets.items() if not data.empty}
+    return CuboKPIs.construir(datasets) if datasets else CuboKPIs.combinar([])
+
+# Los cubos de cada provincia tienen celdas disjuntas: se combinan sin volver a agregar
+def cargar_cubo(provincias, version_venta, version_alquiler):
+    for tipo, version in [("Venta", version_venta), ("Alquiler", version_alquiler)]:
+        if version:
+            provincias_publicadas(tipo)
+    return CuboKPIs.combinar([
+        cargar_cubo_provincia(provincia, version_venta, version_alquiler) for provincia in provincias
+    ])
 
 @st.cache_data
-def cargar_geojson():
+def cargar_geojson(provincias):
     try:
-        geojson_path = "MADRID.geojson"
-        madrid_geojson = gpd.read_file(geojson_path)
-        return madrid_geojson
-    except FileNotFoundError:
-        st.error("No se encontró el archivo MADRID.geojson.")
-        return None
+        # Geometrías de Madrid previas a la partición por provincias
+        if not os.path.isdir(DIRECTORIO_GEOMETRIAS) and os.path.exists("MADRID.geojson"):
+            particionar_geojson("MADRID.geojson")
+        rutas = [ruta for ruta in map(ruta_geometria, provincias) if ruta]
+        if not rutas:
+            st.warning("No hay geometrías de códigos postales para las provincias seleccionadas.")
+            return None
+        return pd.concat([gpd.read_file(ruta) for ruta in rutas], ignore_index=True)
     except Exception as e:
         st.error(f"Error al cargar el archivo GeoJSON: {str(e)}")
         return None
 
+# Informes de KPIs por versión de los datos, generados en segundo plano
+@st.cache_resource
+def gestor_informes():
+    return GestorInformes()
+
+@st.cache_resource(max_entries=4)
+def leer_informe(ruta):
+    # La ruta incluye la versión: los bytes se leen una vez y se comparten entre sesiones
+    with open(ruta, "rb") as f:
+        return f.read()
+
+def preparar_informe():
+    """Encola el informe de la versión actual de los CSV si aún no existe; devuelve esa versión (o None)."""
+    # Normalmente ya lo ha generado el ETL (regiones.py); esto es el respaldo si los CSV cambian sin pasar por él.
+    # Solo se consulta la fecha y el tamaño de los CSV: particionar y agregar se hace en el hilo de informes
+    version = version_datos_informe()
+    if version is None:
+        return None
+    regiones = regiones_compartidas()
+    version_venta, version_alquiler = version_datos("Venta"), version_datos("Alquiler")
+
+    def cubos_provincias():
+        for tipo in ["Venta", "Alquiler"]:
+            try:
+                regiones.publicar_csv(tipo)
+            except FileNotFoundError:
+                pass  # El error se muestra en la página que use esos datos
+        # Los mismos cubos por provincia (en caché) que usa la Vista para Usuarios
+        provincias = sorted(set(regiones.provincias("Venta")) | set(regiones.provincias("Alquiler")))
+        return [cargar_cubo_provincia(provincia, version_venta, version_alquiler) for provincia in provincias]
+
+    gestor_informes().asegurar(version, cubos_provincias)
+    return version
+
 # Función para escalar los datos
 def escalar_datos(df, columnas):
     scaler = MinMaxScaler()
@@ -197,12 +260,27 @@ elif menu == "Vista para Usuarios":
     Esta sección está orientada al público en general y ofrece análisis interactivo de inmuebles.
     """)
 
-    # Cargar datos y GeoJSON
+    # Cargar datos y GeoJSON de las provincias seleccionadas
     tipo_datos = st.sidebar.radio("Selecciona el tipo de datos", ["Alquiler", "Venta"])
-    data = cargar_datos(tipo_datos)
-    geojson_data = cargar_geojson()
+    version = version_datos(tipo_datos)
+    provincias_disponibles = provincias_publicadas(tipo_datos)
+    provincias = st.sidebar.multiselect(
+        "Provincias",
+        options=provincias_disponibles,
+        default=[p for p in ["28"] if p in provincias_disponibles] or provincias_disponibles[:1],
+        format_func=nombre_provincia,
+    )
+    provincias = tuple(sorted(provincias))
+    data = cargar_regiones(tipo_datos, provincias, version)
+    geojson_data = cargar_geojson(provincias)
+    localidades = cargar_localidades(tipo_datos, provincias, version)
 
     if not data.empty:
+        # Filtros activos: junto con la versión forman la clave de las figuras en caché
+        rango_precio = habitaciones_seleccionadas = baños_seleccionados = None
+        rango_precio_cubo = (None, None)  # Sin filtro de precio en el cubo mientras el slider abarque todo
+        codigo_postal_seleccionado = []
+
         # Filtro de precio
         if "precio" in data.columns:
             st.sidebar.subheader("Filtro de Precios")
@@ -215,6 +293,8 @@ elif menu == "Vista para Usuarios":
                 step=100
             )
             data = data[(data["precio"] >= rango_precio[0]) & (data["precio"] <= rango_precio[1])]
+            if tuple(rango_precio) != (precio_min, precio_max):
+                rango_precio_cubo = rango_precio
         else:
             st.warning("La columna 'precio' no está disponible en los datos.")
 
@@ -250,13 +330,33 @@ elif menu == "Vista para Usuarios":
             codigo_postal_seleccionado = st.sidebar.multiselect(
                 "Filtrar por Código Postal",
                 options=codigos_postales_unicos,
-                default=codigos_postales_unicos[:5]
+                default=codigos_postales_unicos[:5],
+                format_func=lambda cp: f"{cp} · {localidades[int(cp)]}" if int(cp) in localidades else str(cp)
             )
             if codigo_postal_seleccionado:
                 data = data[data["cp"].isin(codigo_postal_seleccionado)]
         else:
             st.warning("No hay datos de códigos postales disponibles para filtrar.")
 
+        # Indicadores clave desde el cubo pre-agregado (no recorre los anuncios)
+        cubo = cargar_cubo(provincias, version_datos("Venta"), version_datos("Alquiler"))
+        kpis = cubo.consultar(
+            operacion=tipo_datos,
+            cp=codigo_postal_seleccionado,
+            habitaciones=None if habitaciones_seleccionadas in (None, "Todas") else habitaciones_seleccionadas,
+            baños=None if baños_seleccionados in (None, "Todas") else baños_seleccionados,
+            precio_min=rango_precio_cubo[0],
+            precio_max=rango_precio_cubo[1],
+        )
+        st.subheader("Indicadores Clave")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Inmuebles", f"{kpis['cantidad']:,}")
+        col2.metric("Precio medio (€)", f"{kpis['precio_medio']:,.0f}")
+        col3.metric("Precio mediano (€)", f"{kpis['precio_mediano']:,.0f}")
+        col4.metric("Percentil 90 (€)", f"{kpis['percentiles'][0.9]:,.0f}")
+        st.caption("Mediana y percentiles aproximados (±2 %). Con un rango de precios, el recuento y el precio "
+                   "medio también son aproximados: el cubo agrupa los precios en tramos del ±2 %.")
+
         # Tabla interactiva
         st.subheader("Datos Filtrados")
         st.dataframe(data)
@@ -265,6 +365,8 @@ elif menu == "Vista para Usuarios":
         if geojson_data is not None:
             st.subheader("Mapa Coroplético - Cantidad de Inmuebles por Código Postal")
             inmuebles_count_cp = data.groupby("cp").size().reset_index(name="Cantidad de Inmuebles")
+            inmuebles_count_cp["cp"] = inmuebles_count_cp["cp"].astype(str).str.zfill(5)  # El GeoJSON usa el CP como texto
+            centro, zoom = centro_mapa(geojson_data)
             fig = px.choropleth_mapbox(
                 inmuebles_count_cp,
                 geojson=geojson_data,
@@ -274,51 +376,45 @@ elif menu == "Vista para Usuarios":
                 hover_name="cp",
                 title="Cantidad de Inmuebles por Código Postal",
                 mapbox_style="carto-positron",
-                center={"lat": 40.4168, "lon": -3.7038},
-                zoom=10,
+                center=centro,
+                zoom=zoom,
                 color_continuous_scale="Viridis"
             )
             st.plotly_chart(fig, use_container_width=True)
 
+        filtros = (
+            tuple(rango_precio) if rango_precio else None,
+            habitaciones_seleccionadas,
+            baños_seleccionados,
+            tuple(codigo_postal_seleccionado),
+        )
+        clave_figuras = (version, tipo_datos, provincias, filtros)
+
         # Histograma de precios
         st.subheader("Histograma de Precios")
-        fig = px.histogram(
-            data,
-            x='precio',
-            nbins=50,
-            title='Distribución de Precios',
-            labels={'precio': 'Precio (€)'}
+        fig = cache_figuras().obtener(
+            clave_figuras + ("histograma",),
+            lambda: figura_histograma(*histograma(data["precio"].to_numpy(), nbins=50)),
         )
         st.plotly_chart(fig, use_container_width=True)
 
         # Relación entre precio y superficie construida
         st.subheader("Relación entre Precio y Superficie Construida")
-        superficie_df = data[data["superficie construida"] <= 2000].dropna(subset=["precio", "superficie construida", "cp"])
-        fig = px.scatter(
-            superficie_df,
-            x="superficie construida",
-            y="precio",
-            color="cp",
-            title="Relación entre Precio y Superficie Construida por Código Postal",
-            labels={"superficie construida": "Superficie Construida (m²)", "precio": "Precio (€)", "cp": "Código Postal"}
-        )
+
+        def construir_dispersion():
+            superficie_df = data[data["superficie construida"] <= 2000].dropna(subset=["precio", "superficie construida", "cp"])
+            return figura_dispersion(superficie_df["superficie construida"], superficie_df["precio"], superficie_df["cp"])
+
+        fig = cache_figuras().obtener(clave_figuras + ("dispersion",), construir_dispersion)
         st.plotly_chart(fig, use_container_width=True)
 
         # Relación entre precio y antigüedad (Boxplot)
-        if "antigüedad" in data.columns:
+        if "años antigüedad" in data.columns:
             st.subheader("Relación entre Precio y Antigüedad (Boxplot)")
-            data['antigüedad'] = pd.to_numeric(data['antigüedad'].astype(str).str.extract(r'(\d+)')[0], errors='coerce')
-            data['precio'] = pd.to_numeric(data['precio'].astype(str).str.replace(r'[^\d.]', '', regex=True), errors='coerce')
-            data = data.dropna(subset=['antigüedad', 'precio'])
-
-            # Crear el boxplot
-            fig = px.box(
-                data,
-                x='antigüedad',
-                y='precio',
-                title='Distribución de Precios por Antigüedad',
-                labels={'antigüedad': 'Antigüedad (años)', 'precio': 'Precio (€)'},
-                color='antigüedad',  # Opcional, para diferenciar por color
+            # Cuantiles por antigüedad sobre columnas ya tipadas; 'data' no se modifica
+            fig = cache_figuras().obtener(
+                clave_figuras + ("boxplot",),
+                lambda: figura_boxplot(cuantiles_por_grupo(data["años antigüedad"].to_numpy(), data["precio"].to_numpy())),
             )
             st.plotly_chart(fig, use_container_width=True)
         else:
@@ -380,7 +476,7 @@ elif menu == "Vista para Usuarios":
         st.write(f"**Habitaciones**: {inmueble.get('habitaciones', 'No disponible')}")
         st.write(f"**Baños**: {inmueble.get('baños', 'No disponible')}")
         st.write(f"**Ubicación**: {inmueble.get('localización', 'No disponible')}")
-        st.write(f"**Antigüedad**: {inmueble.get('antigüedad', 'No disponible')} años")
+        st.write(f"**Antigüedad**: {inmueble.get('antigüedad', 'No disponible')}")  # El texto ya incluye "años"
 
         # Mostrar imágenes del inmueble si están disponibles
         imagen_url = inmueble.get("imagen", None)
@@ -415,23 +511,29 @@ elif menu == "Vista para Clientes":
 
 
 
-    # **1. Descargar el PDF:**
-    st.subheader("Descargar el Dashboard en PDF:")
-    pdf_path = "dashboard.pdf"  # Ruta del archivo PDF
-    if os.path.exists(pdf_path):
-        try:
-            with open(pdf_path, "rb") as f:
-                pdf_data = f.read()
-            st.download_button(
-                label="Descargar Dashboard PDF",
-                data=pdf_data,
-                file_name="dashboard.pdf",
-                mime="application/pdf"
-            )
-        except Exception as e:
-            st.error(f"Error al procesar el archivo PDF: {e}")
+    # **1. Descargar el informe de KPIs de la versión actual de los datos:**
+    st.subheader("Descargar el Informe de KPIs (PDF y HTML):")
+    gestor = gestor_informes()
+    version_informe = preparar_informe()
+    if version_informe is None:
+        st.error(f"No se encontraron los archivos de datos: {', '.join(RUTAS_DATOS.values())}")
     else:
-        st.error(f"No se encontró el archivo PDF: '{pdf_path}'. Verifica su ubicación.")
+        disponible = version_informe if gestor.listo(version_informe) else gestor.ultimo_listo()
+        if version_informe in gestor.errores:
+            st.error(f"Error al generar el informe: {gestor.errores[version_informe]}")
+        elif disponible != version_informe:
+            st.info("Generando el informe con los datos actuales. "
+                    + ("Mientras tanto puedes descargar el de la versión anterior." if disponible
+                       else "Vuelve a cargar la página en unos segundos."))
+        if disponible:
+            columnas = st.columns(len(FORMATOS))
+            for columna, (formato, mime) in zip(columnas, FORMATOS.items()):
+                columna.download_button(
+                    label=f"Descargar Informe {formato.upper()}",
+                    data=leer_informe(gestor.ruta(disponible, formato)),
+                    file_name=f"informe_kpis_{disponible}.{formato}",
+                    mime=mime
+                )
 
 
     # **2. Power BI:**
@@ -496,46 +598,20 @@ elif menu == "Análisis Avanzado":
         # Formulario para ingresar datos del inmueble
         st.write("Ingrese las características del inmueble para realizar la predicción:")
 
-        @st.cache_data
-        def cargar_datos(tipo):
-            try:
-                # Selección del archivo según el tipo de operación
-                data_path = "inmuebles_alquilerconcp.csv" if tipo == "Alquiler" else "inmuebles_ventaconcp.csv"
-                data = pd.read_csv(data_path)
-                data.columns = data.columns.str.lower().str.strip()
-
-                # Convertir columnas específicas a tipo numérico
-                columnas_numericas = ["precio", "superficie construida", "habitaciones", "baños", "consumo energético", "emisiones co2"]
-                for columna in columnas_numericas:
-                    if columna in data.columns:
-                        data[columna] = pd.to_numeric(data[columna], errors="coerce")
-
-                # Manejo de la columna 'cp' (código postal)
-                if "cp" in data.columns:
-                    data["cp"] = data["cp"].astype(str).str.extract(r'(\d{5})')[0]  # Extraer códigos postales válidos
-                    data = data.dropna(subset=["cp"])  # Eliminar filas con códigos postales nulos
-                else:
-                    st.warning("La columna 'cp' no está disponible en los datos. Algunas funcionalidades pueden estar limitadas.")
-                    data["cp"] = None  # Añadir una columna vacía si no existe
-
-                return data
-            except FileNotFoundError:
-                st.error(f"No se encontró el archivo: {data_path}")
-                return pd.DataFrame()
-            except Exception as e:
-                st.error(f"Error al cargar los datos: {str(e)}")
-                return pd.DataFrame()
-
-        # Cargar los datos del tipo de operación
+        # Tipo de operación y provincias: solo se abren las particiones seleccionadas
         tipo_operacion = st.selectbox("Seleccione el tipo de operación", ["Venta", "Alquiler"])
-        datos = cargar_datos(tipo_operacion)
+        provincias_disponibles = provincias_publicadas(tipo_operacion)
+        provincias = st.multiselect(
+            "Provincias",
+            options=provincias_disponibles,
+            default=[p for p in ["28"] if p in provincias_disponibles] or provincias_disponibles[:1],
+            format_func=nombre_provincia,
+        )
 
-        # Extraer códigos postales únicos
-        if not datos.empty and "cp" in datos.columns:
-            codigos_postales = datos["cp"].dropna().unique()
-            codigos_postales.sort()
-        else:
-            codigos_postales = []
+        # Códigos postales de las celdas del cubo, sin recorrer los anuncios (CP 0 = sin código postal)
+        cubo = cargar_cubo(tuple(sorted(provincias)), version_datos("Venta"), version_datos("Alquiler"))
+        codigos_postales = np.sort(cubo.celdas.loc[cubo.seleccionar(operacion=tipo_operacion), "cp"].unique())
+        codigos_postales = codigos_postales[codigos_postales > 0]
 
         # Verificar si hay códigos postales disponibles
         if codigos_postales.size == 0:
@@ -545,7 +621,7 @@ elif menu == "Análisis Avanzado":
         superficie = st.number_input("Superficie Construida (m²)", min_value=10, max_value=1000, value=100)
         habitaciones = st.number_input("Número de Habitaciones", min_value=1, max_value=10, value=3)
         baños = st.number_input("Número de Baños", min_value=1, max_value=5, value=1)
-        codigo_postal = st.selectbox("Código Postal", codigos_postales)
+        codigo_postal = st.selectbox("Código Postal", codigos_postales, format_func=lambda cp: str(cp).zfill(5))
 
         # Botón para realizar la predicción
         if st.button("Predecir Precio"):
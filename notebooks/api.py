@@ -0,0 +1,249 @@
+"""
+API JSON sin interfaz para consumidores que no son Streamlit.
+
+Se ejecuta como un proceso aparte, junto a la app, y usa la misma capa de datos
+(`datos.py`):
+
+    python api.py --puerto 8000
+
+Endpoints (todos GET):
+
+    /inmuebles?tipo=Venta&precio_min=&precio_max=&habitaciones=&baños=&cp=28013,28014&q=&pagina=1&por_pagina=50
+    /inmuebles/<id>?tipo=Venta
+    /agregados/cp?tipo=Venta
+    /prediccion?superficie=100&habitaciones=3&baños=1&cp=28013
+
+Cada respuesta se guarda en una caché LRU con clave (ruta, consulta normalizada,
+versión del dataset), con su ETag y su versión comprimida con gzip ya
+calculadas. Una petición repetida solo cuesta la búsqueda en la caché, y si el
+cliente envía `If-None-Match` con el ETag de la representación que recibiría
+(comparación débil, lista separada por comas o `*`) se responde 304 sin cuerpo.
+El cuerpo gzip lleva su propio ETag (`"<sha1>-gz"`): no es idéntico byte a byte.
+
+`prueba_carga.py` lanza peticiones concurrentes contra la API y mide req/s.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import joblib
+import numpy as np
+
+from cache import CacheLRU
+from datos import RUTAS_DATOS, agregados_por_cp, filtrar_inmuebles, leer_inmuebles, version_datos
+
+RUTA_MODELO = "model.pkl"
+POR_PAGINA_MAX = 500
+
+
+class ErrorConsulta(Exception):
+    """Parámetros de consulta inválidos (se responde 400)."""
+
+
+class Respuesta:
+    """Cuerpo JSON ya serializado, comprimido y con su ETag."""
+
+    def __init__(self, contenido, estado=200):
+        self.estado = estado
+        self.cuerpo = json.dumps(contenido, ensure_ascii=False, default=_a_json).encode("utf-8")
+        self.cuerpo_gzip = gzip.compress(self.cuerpo, compresslevel=6)
+        self.etag = '"' + hashlib.sha1(self.cuerpo).hexdigest() + '"'
+        self.etag_gzip = self.etag[:-1] + '-gz"'
+
+
+def coincide_etag(if_none_match, etag):
+    """Comparación débil de `If-None-Match` (lista de ETags o `*`) con el ETag de la respuesta."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidato.strip().removeprefix("W/") == etag for candidato in if_none_match.split(","))
+
+
+def _a_json(valor):
+    # Tipos de NumPy/pandas que json no sabe serializar
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return str(valor)
+
+
+def _registros(df):
+    """Filas de un DataFrame como lista de dicts con NaN convertido en null."""
+    return json.loads(df.to_json(orient="records", force_ascii=False))
+
+
+class DatosAPI:
+    """Datasets en memoria; se recargan cuando cambia la versión del CSV."""
+
+    def __init__(self):
+        self._datasets = {}
+        self._lock = threading.Lock()
+        self._modelo = None
+
+    def obtener(self, tipo):
+        """Devuelve (versión, DataFrame) del tipo de operación pedido."""
+        if tipo not in RUTAS_DATOS:
+            raise ErrorConsulta(f"Tipo desconocido: {tipo!r} (usa {', '.join(RUTAS_DATOS)})")
+        version = version_datos(tipo)
+        with self._lock:
+            actual = self._datasets.get(tipo)
+            if actual is None or actual[0] != version:
+                actual = (version, leer_inmuebles(tipo))
+                self._datasets[tipo] = actual
+        return actual
+
+    def modelo(self):
+        if self._modelo is None:
+            self._modelo = joblib.load(RUTA_MODELO)
+        return self._modelo
+
+
+def _numero(params, nombre, tipo=float):
+    valor = params.get(nombre)
+    if valor in (None, ""):
+        return None
+    try:
+        return tipo(valor)
+    except ValueError:
+        raise ErrorConsulta(f"'{nombre}' debe ser numérico: {valor!r}")
+
+
+def _cps(params):
+    valor = params.get("cp")
+    if not valor:
+        return ()
+    try:
+        return tuple(sorted({int(cp) for cp in valor.split(",") if cp.strip()}))
+    except ValueError:
+        raise ErrorConsulta(f"'cp' debe ser una lista de códigos postales: {valor!r}")
+
+
+def normalizar_consulta(ruta, params):
+    """Clave canónica de una consulta: mismos filtros en distinto orden o formato dan la misma clave."""
+    tipo = params.get("tipo", "Venta").strip().capitalize()
+    if ruta == "/inmuebles":
+        por_pagina = _numero(params, "por_pagina", int) or 50
+        return (ruta, tipo, (
+            _numero(params, "precio_min"),
+            _numero(params, "precio_max"),
+            _numero(params, "habitaciones"),
+            _numero(params, "baños"),
+            _cps(params),
+            params.get("q", "").strip().lower() or None,
+            max(_numero(params, "pagina", int) or 1, 1),
+            min(max(por_pagina, 1), POR_PAGINA_MAX),
+        ))
+    if ruta == "/prediccion":
+        return (ruta, tipo, tuple(
+            _numero(params, nombre) for nombre in ["superficie", "habitaciones", "baños", "cp"]
+        ))
+    return (ruta, tipo, ())
+
+
+class ServicioAPI:
+    """Resuelve consultas normalizadas usando la caché de respuestas."""
+
+    def __init__(self, max_entradas=1024):
+        self.datos = DatosAPI()
+        self.cache = CacheLRU(max_entradas=max_entradas)
+
+    def responder(self, ruta, params):
+        try:
+            if ruta.startswith("/inmuebles/"):
+                clave = ("/inmuebles/id", params.get("tipo", "Venta").strip().capitalize(),
+                         unquote(ruta[len("/inmuebles/"):]))
+            else:
+                clave = normalizar_consulta(ruta, params)
+            version, data = self.datos.obtener(clave[1])
+            return self.cache.obtener((version,) + clave, lambda: self._construir(clave, data))
+        except ErrorConsulta as e:
+            return Respuesta({"error": str(e)}, estado=400)
+        except FileNotFoundError as e:
+            return Respuesta({"error": f"No se encontró el archivo: {e.filename}"}, estado=503)
+        except Exception as e:
+            return Respuesta({"error": f"Error al procesar la consulta: {e}"}, estado=500)
+
+    def _construir(self, clave, data):
+        ruta, tipo, args = clave
+        if ruta == "/inmuebles":
+            precio_min, precio_max, habitaciones, baños, cps, texto, pagina, por_pagina = args
+            filtrado = filtrar_inmuebles(data, precio_min, precio_max, habitaciones, baños, cps, texto)
+            inicio = (pagina - 1) * por_pagina
+            return Respuesta({
+                "tipo": tipo,
+                "total": len(filtrado),
+                "pagina": pagina,
+                "por_pagina": por_pagina,
+                "inmuebles": _registros(filtrado.iloc[inicio:inicio + por_pagina]),
+            })
+        if ruta == "/inmuebles/id":
+            inmueble = data[data["id"].astype(str) == args]
+            if inmueble.empty:
+                return Respuesta({"error": f"No existe el inmueble {args}"}, estado=404)
+            return Respuesta(_registros(inmueble.head(1))[0])
+        if ruta == "/agregados/cp":
+            return Respuesta({"tipo": tipo, "codigos_postales": _registros(agregados_por_cp(data))})
+        if ruta == "/prediccion":
+            if any(valor is None for valor in args):
+                raise ErrorConsulta("Faltan parámetros: superficie, habitaciones, baños y cp son obligatorios")
+            # Si falta model.pkl, el FileNotFoundError llega a `responder` (503, sin guardarse en caché)
+            prediccion = self.datos.modelo().predict(np.array([args]))
+            return Respuesta({"entrada": dict(zip(["superficie", "habitaciones", "baños", "cp"], args)),
+                              "precio_estimado": float(prediccion[0])})
+        return Respuesta({"error": f"Ruta desconocida: {ruta}"}, estado=404)
+
+
+class ManejadorAPI(BaseHTTPRequestHandler):
+    servicio = None  # Se asigna en `servir`
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {clave: valores[-1] for clave, valores in parse_qs(url.query).items()}
+        respuesta = self.servicio.responder(url.path.rstrip("/") or "/", params)
+
+        usar_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        etag = respuesta.etag_gzip if usar_gzip else respuesta.etag
+        if respuesta.estado == 200 and coincide_etag(self.headers.get("If-None-Match"), etag):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        cuerpo = respuesta.cuerpo_gzip if usar_gzip else respuesta.cuerpo
+        self.send_response(respuesta.estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.send_header("ETag", etag)
+        self.send_header("Vary", "Accept-Encoding")
+        if usar_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass  # Sin una línea de log por petición: ensucia la salida de la prueba de carga
+
+
+def servir(puerto=8000, host="127.0.0.1"):
+    ManejadorAPI.servicio = ServicioAPI()
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorAPI)
+    print(f"API escuchando en http://{host}:{puerto}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API JSON de inmuebles")
+    parser.add_argument("--puerto", type=int, default=8000)
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+    servir(args.puerto, args.host)
@@ -5,9 +5,10 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import plotly.express as px
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
-from sklearn.ensemble import RandomForestClassifier
-import joblib
+import time
+
+from datos import compactar_inmuebles
+from entrenamiento import GestorEntrenamientos, cargar_modelo, version_modelo_actual
 
 # Configuración general de Streamlit
 st.set_page_config(page_title="Análisis de Inmuebles", page_icon="🏠", layout="wide", initial_sidebar_state="expanded")
@@ -39,8 +40,13 @@ def cargar_datos():
             else:
                 st.warning(f"Columna '{col}' no encontrada en los datos.")
 
-        # Rellenar valores faltantes
-        data = data.fillna(0)
+        # Tipos compactos (categorías, float32, CP entero) compartidos con 03.app.py
+        data = compactar_inmuebles(data)
+
+        # Rellenar valores faltantes después de compactar. La superficie útil se queda en NaN: su
+        # "No especificado" pasa a NaN al convertirla y un 0 sería una superficie falsa
+        numericas = data.select_dtypes(include=["number"]).columns.drop("superficie útil", errors="ignore")
+        data[numericas] = data[numericas].fillna(0)
 
         return data
 
@@ -51,6 +57,16 @@ def cargar_datos():
         st.error(f"Error al cargar datos: {str(e)}")
         return pd.DataFrame()
 
+# Trabajos de entrenamiento en segundo plano, compartidos por todas las sesiones
+@st.cache_resource
+def gestor_entrenamientos():
+    return GestorEntrenamientos()
+
+# Cada versión del modelo se carga una vez; una versión nueva tiene otra clave
+@st.cache_resource
+def cargar_modelo_clasificacion(version):
+    return cargar_modelo(version)
+
 # Página de inicio
 if menu == "Inicio":
     st.title("Bienvenido a la Plataforma de Análisis Inmobiliario")
@@ -113,41 +129,51 @@ elif menu == "Modelo de Clasificación":
     data = cargar_datos()
 
     if not data.empty:
-        # Seleccionar columnas numéricas
-        numeric_data = data.select_dtypes(include=["number"]).dropna()
+        # Seleccionar columnas numéricas (sin la superficie útil, que falta en muchos anuncios)
+        numeric_data = data.select_dtypes(include=["number"]).drop(columns=["superficie útil"], errors="ignore").dropna()
         if numeric_data.empty:
             st.error("No hay suficientes datos numéricos para entrenar un modelo.")
         else:
-            # Escalar datos
+            # Escalar datos (el escalador se ajusta dentro del trabajo, en cada partición de la validación cruzada)
             st.subheader("Escalado de Datos")
             scaler_option = st.radio("Selecciona el método de escalado", ["StandardScaler", "MinMaxScaler"])
-            scaler = StandardScaler() if scaler_option == "StandardScaler" else MinMaxScaler()
-            scaled_data = scaler.fit_transform(numeric_data)
-            st.write("Datos escalados listos para el modelo.")
+            st.write("El escalado forma parte del modelo: se aplica igual al entrenar y al predecir.")
 
             # División en conjunto de entrenamiento y prueba
             test_size = st.slider("Tamaño del conjunto de prueba (%)", 10, 50, 20) / 100
-            X_train, X_test = train_test_split(scaled_data, test_size=test_size, random_state=42)
+            X_train, X_test = train_test_split(numeric_data.to_numpy(), test_size=test_size, random_state=42)
             st.write(f"Conjunto de entrenamiento: {len(X_train)} muestras")
             st.write(f"Conjunto de prueba: {len(X_test)} muestras")
 
-            # Entrenar modelo de clasificación
+            # Entrenar modelo de clasificación en segundo plano
+            gestor = gestor_entrenamientos()
             if st.button("Entrenar Modelo"):
                 y_train = np.random.choice(["Grupo 1", "Grupo 2", "Grupo 3"], size=len(X_train))
-                model = RandomForestClassifier(random_state=42)
-                model.fit(X_train, y_train)
-                st.success("Modelo entrenado con éxito.")
-                joblib.dump(model, "modelo_clasificacion.pkl")
-                st.success("Modelo guardado como 'modelo_clasificacion.pkl'.")
+                st.session_state["trabajo_entrenamiento"] = gestor.lanzar(X_train, y_train, escalador=scaler_option)
+
+            trabajo = gestor.trabajo(st.session_state.get("trabajo_entrenamiento"))
+            if trabajo is not None:
+                if trabajo.activo:
+                    st.progress(trabajo.progreso, text=f"Búsqueda de hiperparámetros con validación cruzada: "
+                                                       f"{trabajo.completados}/{trabajo.total} ajustes")
+                    time.sleep(1)
+                    st.rerun()
+                elif trabajo.estado == "terminado":
+                    st.success(f"Modelo entrenado con éxito (versión {trabajo.version}, "
+                               f"precisión media en validación cruzada {trabajo.mejor_puntuacion:.3f}).")
+                    st.write("Mejores hiperparámetros:", trabajo.mejores_parametros)
+                else:
+                    st.error(f"Error al entrenar el modelo: {trabajo.error}")
 
             # Cargar modelo y predecir
             if st.button("Probar Modelo"):
-                try:
-                    model = joblib.load("modelo_clasificacion.pkl")
-                    y_pred = model.predict(X_test)
-                    st.write("Predicciones:")
-                    st.write(y_pred)
-                except FileNotFoundError:
+                version = version_modelo_actual()
+                if version is None:
                     st.error("El modelo no se encuentra. Entrena un modelo primero.")
+                else:
+                    artefacto = cargar_modelo_clasificacion(version)
+                    y_pred = artefacto["modelo"].predict(X_test)
+                    st.write(f"Predicciones (modelo {version}):")
+                    st.write(y_pred)
     else:
         st.error("No se pudieron cargar los datos para el modelo de clasificación.")
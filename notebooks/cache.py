@@ -0,0 +1,36 @@
+"""Caché LRU en memoria, compartida por la app de Streamlit y la API JSON."""
+import threading
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """Caché de tamaño fijo que descarta la entrada usada hace más tiempo."""
+
+    def __init__(self, max_entradas=128):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()  # Las sesiones de Streamlit comparten la caché desde varios hilos
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def __contains__(self, clave):
+        return clave in self._entradas
+
+    def obtener(self, clave, construir):
+        """Devuelve el valor guardado para `clave` o lo construye con `construir()` y lo guarda."""
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                return self._entradas[clave]
+        valor = construir()
+        with self._lock:
+            self._entradas[clave] = valor
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
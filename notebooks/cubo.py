@@ -0,0 +1,196 @@
+"""
+Cubo OLAP pre-agregado para los KPIs del dashboard.
+
+Dimensiones: operación × CP × tipo de casa × habitaciones × baños. Cada celda
+guarda el número de inmuebles, la suma de precios y de superficies y un sketch
+de cuantiles del precio. La superficie media y el €/m² solo usan los anuncios
+que tienen superficie: cada celda lleva aparte cuántos son y la suma de sus
+precios. Cualquier selección de la barra lateral se responde
+sumando las celdas seleccionadas, así que el coste depende del número de celdas
+y no del número de anuncios.
+
+El sketch es un histograma con cubos logarítmicos (DDSketch): el valor x cae en
+el cubo ceil(log(x) / log(gamma)), con gamma = (1 + α) / (1 - α). Dos sketches
+se combinan sumando sus conteos, y cualquier cuantil estimado tiene un error
+relativo de como mucho α (2 % por defecto) frente al valor exacto. Se usa en
+lugar de t-digest/KLL porque es exactamente mergeable y se vectoriza con NumPy.
+"""
+import numpy as np
+import pandas as pd
+
+ERROR_RELATIVO = 0.02
+GAMMA = (1 + ERROR_RELATIVO) / (1 - ERROR_RELATIVO)
+# Rango de cubos: de 50 € (alquileres) a 100 M€; fuera de él se satura en los extremos
+CUBO_MIN = int(np.floor(np.log(50) / np.log(GAMMA)))
+CUBO_MAX = int(np.ceil(np.log(1e8) / np.log(GAMMA)))
+
+DIMENSIONES = ["operacion", "cp", "tipo de casa", "habitaciones", "baños"]
+
+
+def _cubos(precios):
+    """Índice de cubo (columna del sketch) de cada precio."""
+    indice = np.ceil(np.log(np.maximum(precios, 1.0)) / np.log(GAMMA)).astype(np.int64)
+    return np.clip(indice, CUBO_MIN, CUBO_MAX) - CUBO_MIN
+
+
+def _valor_cubo(indice):
+    """Valor representativo del cubo: el que minimiza el error relativo."""
+    exponente = indice + CUBO_MIN
+    return 2 * GAMMA ** exponente / (GAMMA + 1)
+
+
+def cuantiles_sketch(conteos, qs):
+    """Cuantiles aproximados a partir de los conteos (ya combinados) de un sketch."""
+    total = conteos.sum()
+    if total == 0:
+        return np.full(len(qs), np.nan)
+    acumulado = np.cumsum(conteos)
+    rangos = np.asarray(qs, dtype=np.float64) * (total - 1)
+    return _valor_cubo(np.searchsorted(acumulado, rangos, side="right"))
+
+
+class CuboKPIs:
+    """Celdas ocupadas del cubo con sus agregados y sketches."""
+
+    def __init__(self, celdas, conteos, sumas_precio, sumas_superficie, conteos_superficie,
+                 sumas_precio_superficie, sketches):
+        self.celdas = celdas  # DataFrame con una fila por celda y una columna por dimensión
+        self.conteos = conteos
+        self.sumas_precio = sumas_precio
+        self.sumas_superficie = sumas_superficie
+        # Anuncios con superficie y suma de sus precios (denominador de la superficie media y del €/m²)
+        self.conteos_superficie = conteos_superficie
+        self.sumas_precio_superficie = sumas_precio_superficie
+        self.sketches = sketches  # (celdas, cubos) uint32
+
+    @classmethod
+    def construir(cls, datasets):
+        """Construye el cubo a partir de {"Venta": df, "Alquiler": df} leídos con `leer_inmuebles`."""
+        partes = []
+        for operacion, data in datasets.items():
+            data = data.dropna(subset=["precio"])
+            partes.append(pd.DataFrame({
+                "operacion": operacion,
+                "cp": data["cp"].astype("Int64").fillna(0).to_numpy(dtype=np.int64),
+                "tipo de casa": data["tipo de casa"].astype(str).to_numpy(),
+                # -1 = "No especificado"
+                "habitaciones": data["habitaciones"].fillna(-1).to_numpy(dtype=np.int64),
+                "baños": data["baños"].fillna(-1).to_numpy(dtype=np.int64),
+                "precio": data["precio"].to_numpy(dtype=np.float64),
+                "superficie": data["superficie construida"].to_numpy(dtype=np.float64),
+            }))
+        filas = pd.concat(partes, ignore_index=True)
+
+        codigos, celdas = pd.factorize(pd.MultiIndex.from_frame(filas[DIMENSIONES]))
+        n_celdas = len(celdas)
+        # Conteo de (celda, cubo) con bincount; uint32 para no desbordar en celdas muy grandes
+        n_cubos = CUBO_MAX - CUBO_MIN + 1
+        planos = codigos * n_cubos + _cubos(filas["precio"].to_numpy())
+        sketches = np.bincount(planos, minlength=n_celdas * n_cubos)
+        if sketches.max(initial=0) > np.iinfo(np.uint32).max:
+            raise OverflowError("Demasiados anuncios en un cubo del sketch para guardarlo en uint32")
+        sketches = sketches.reshape(n_celdas, n_cubos).astype(np.uint32)
+
+        con_superficie = filas["superficie"].notna().to_numpy()
+        return cls(
+            celdas=pd.DataFrame(celdas.tolist(), columns=DIMENSIONES),
+            conteos=np.bincount(codigos, minlength=n_celdas),
+            sumas_precio=np.bincount(codigos, weights=filas["precio"], minlength=n_celdas),
+            sumas_superficie=np.bincount(codigos[con_superficie], weights=filas["superficie"][con_superficie],
+                                         minlength=n_celdas),
+            conteos_superficie=np.bincount(codigos[con_superficie], minlength=n_celdas),
+            sumas_precio_superficie=np.bincount(codigos[con_superficie], weights=filas["precio"][con_superficie],
+                                                minlength=n_celdas),
+            sketches=sketches,
+        )
+
+    @classmethod
+    def combinar(cls, cubos):
+        """Une cubos con celdas disjuntas (p. ej. uno por provincia) sin volver a leer los anuncios."""
+        cubos = [cubo for cubo in cubos if len(cubo.celdas)]
+        if len(cubos) == 1:
+            return cubos[0]
+        if not cubos:
+            n_cubos = CUBO_MAX - CUBO_MIN + 1
+            return cls(pd.DataFrame(columns=DIMENSIONES), np.zeros(0, dtype=np.int64), np.zeros(0),
+                       np.zeros(0), np.zeros(0, dtype=np.int64), np.zeros(0),
+                       np.zeros((0, n_cubos), dtype=np.uint32))
+        return cls(
+            celdas=pd.concat([cubo.celdas for cubo in cubos], ignore_index=True),
+            conteos=np.concatenate([cubo.conteos for cubo in cubos]),
+            sumas_precio=np.concatenate([cubo.sumas_precio for cubo in cubos]),
+            sumas_superficie=np.concatenate([cubo.sumas_superficie for cubo in cubos]),
+            conteos_superficie=np.concatenate([cubo.conteos_superficie for cubo in cubos]),
+            sumas_precio_superficie=np.concatenate([cubo.sumas_precio_superficie for cubo in cubos]),
+            sketches=np.concatenate([cubo.sketches for cubo in cubos]),
+        )
+
+    def seleccionar(self, operacion=None, cp=None, tipo_casa=None, habitaciones=None, baños=None):
+        """Máscara de celdas; cada filtro es un valor o una lista (None o lista vacía = todas)."""
+        mascara = np.ones(len(self.celdas), dtype=bool)
+        filtros = zip(DIMENSIONES, [operacion, cp, tipo_casa, habitaciones, baños])
+        for dimension, valores in filtros:
+            if valores is None or (np.ndim(valores) and len(valores) == 0):
+                continue
+            mascara &= self.celdas[dimension].isin(np.atleast_1d(valores)).to_numpy()
+        return mascara
+
+    def consultar(self, operacion=None, cp=None, tipo_casa=None, habitaciones=None, baños=None,
+                  precio_min=None, precio_max=None, qs=(0.25, 0.5, 0.75, 0.9)):
+        """KPIs de la selección: número de inmuebles, medias y cuantiles aproximados del precio.
+
+        Con `precio_min`/`precio_max` solo cuentan los cubos del sketch dentro del rango: el
+        recuento puede desviarse en los anuncios a menos de un 2 % de los extremos, el precio
+        medio se estima con el valor de cada cubo y la superficie media y el €/m² quedan en NaN
+        (las superficies no se guardan por cubo). Ambos se calculan solo con los anuncios que
+        tienen superficie.
+        """
+        mascara = self.seleccionar(operacion, cp, tipo_casa, habitaciones, baños)
+        sketch = self.sketches[mascara].sum(axis=0, dtype=np.int64)
+        if precio_min is None and precio_max is None:
+            cantidad = int(self.conteos[mascara].sum())
+            precio_medio = self.sumas_precio[mascara].sum() / cantidad if cantidad else np.nan
+            con_superficie = int(self.conteos_superficie[mascara].sum())
+            sumas_superficie = self.sumas_superficie[mascara].sum()
+            superficie_media = sumas_superficie / con_superficie if con_superficie else np.nan
+            precio_m2 = self.sumas_precio_superficie[mascara].sum() / sumas_superficie if sumas_superficie else np.nan
+        else:
+            desde = _cubos(precio_min) if precio_min is not None else 0
+            hasta = _cubos(precio_max) if precio_max is not None else len(sketch) - 1
+            fuera = np.ones(len(sketch), dtype=bool)
+            fuera[desde:hasta + 1] = False
+            sketch[fuera] = 0
+            cantidad = int(sketch.sum())
+            precio_medio = (sketch * _valor_cubo(np.arange(len(sketch)))).sum() / cantidad if cantidad else np.nan
+            superficie_media = precio_m2 = np.nan
+        cuantiles = cuantiles_sketch(sketch, qs)
+        return {
+            "cantidad": cantidad,
+            "precio_medio": precio_medio,
+            "superficie_media": superficie_media,
+            "precio_m2": precio_m2,
+            "precio_mediano": cuantiles_sketch(sketch, [0.5])[0],
+            "percentiles": dict(zip(qs, cuantiles)),
+        }
+
+    def agrupar(self, dimension, operacion=None, cp=None, tipo_casa=None, habitaciones=None, baños=None):
+        """KPIs de la selección por cada valor de `dimension` (una fila por valor, de más a menos inmuebles)."""
+        mascara = self.seleccionar(operacion, cp, tipo_casa, habitaciones, baños)
+        codigos, valores = pd.factorize(self.celdas.loc[mascara, dimension])
+        n = len(valores)
+        cantidad = np.bincount(codigos, weights=self.conteos[mascara], minlength=n)
+        con_superficie = np.bincount(codigos, weights=self.conteos_superficie[mascara], minlength=n)
+        sumas_superficie = np.bincount(codigos, weights=self.sumas_superficie[mascara], minlength=n)
+        sketches = np.zeros((n, self.sketches.shape[1]), dtype=np.int64)
+        np.add.at(sketches, codigos, self.sketches[mascara])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            resultado = pd.DataFrame({
+                dimension: valores,
+                "cantidad": cantidad.astype(np.int64),
+                "precio_medio": np.bincount(codigos, weights=self.sumas_precio[mascara], minlength=n) / cantidad,
+                "superficie_media": sumas_superficie / con_superficie,
+                "precio_m2": np.bincount(codigos, weights=self.sumas_precio_superficie[mascara], minlength=n)
+                / sumas_superficie,
+                "precio_mediano": [cuantiles_sketch(sketch, [0.5])[0] for sketch in sketches],
+            })
+        return resultado.sort_values("cantidad", ascending=False, ignore_index=True)
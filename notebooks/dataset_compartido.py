@@ -0,0 +1,191 @@
+"""
+Datasets compartidos entre sesiones de Streamlit y procesos, sin copias.
+
+`st.cache_data` devuelve a cada llamada una copia des-serializada (pickle) del
+DataFrame completo, así que cada sesión y cada rerun paga memoria y CPU por
+unos datos que nadie modifica. Aquí cada versión de un dataset se publica una
+sola vez en disco como un directorio de arrays `.npy`. Es el formato de las
+particiones por provincia de `regiones.py`, que es quien publica y abre los
+datasets (un dataset por provincia y tipo de operación):
+
+    datos_regiones/Venta/28/<versión>/
+        esquema.json                 columnas, tipos y categorías
+        <n>.npy                      valores numéricos o códigos de categoría
+        <n>.offsets.npy, <n>.utf8.npy    textos (offsets + bytes UTF-8, como Arrow)
+    datos_regiones/Venta/28/ACTUAL   versión publicada
+
+Los procesos abren los `.npy` con `mmap_mode="r"`: las columnas numéricas y los
+códigos de las categóricas son vistas de solo lectura sobre la caché de páginas
+del sistema, compartida por todos los procesos. Solo los textos únicos por
+anuncio (id, enlace, descripción) se materializan, una vez por proceso. Todas
+las sesiones de un proceso reciben el mismo DataFrame; con copy-on-write de
+pandas cualquier modificación de una sesión crea su propia copia.
+
+Publicar una versión nueva escribe primero en un directorio temporal, lo
+renombra y después sustituye `ACTUAL` con `os.replace`, que es atómico: un
+lector ve la versión anterior completa o la nueva completa, nunca una mezcla.
+`escritura_atomica` aplica lo mismo a un fichero suelto y la usan también los
+punteros, particiones, modelos e informes del resto de módulos.
+Las versiones antiguas se conservan (`limpiar`) para no invalidar los mapas de
+memoria de los procesos que aún las usan.
+
+Desde el pipeline (ETL), tras regenerar los CSV, se publican las particiones
+con `python regiones.py Venta Alquiler`.
+"""
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+
+@contextmanager
+def escritura_atomica(ruta, modo="w"):
+    """Fichero temporal junto a `ruta` que se renombra a `ruta` con `os.replace` si no hay errores."""
+    directorio, nombre = os.path.split(ruta)
+    temporal = os.path.join(directorio, f".{nombre}-{uuid.uuid4().hex}.tmp")
+    try:
+        with open(temporal, modo, encoding=None if "b" in modo else "utf-8") as f:
+            yield f
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def _guardar_textos(ruta, serie):
+    """Textos como offsets int64 + bytes UTF-8 concatenados (None -> offset repetido y máscara)."""
+    valores = serie.astype(object).to_numpy()
+    nulos = pd.isna(valores)
+    codificados = [b"" if nulo else str(valor).encode("utf-8") for valor, nulo in zip(valores, nulos)]
+    offsets = np.zeros(len(codificados) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in codificados], out=offsets[1:])
+    np.save(ruta + ".offsets.npy", offsets)
+    np.save(ruta + ".utf8.npy", np.frombuffer(b"".join(codificados), dtype=np.uint8))
+    np.save(ruta + ".nulos.npy", nulos)
+
+
+def _leer_textos(ruta):
+    offsets = np.load(ruta + ".offsets.npy", mmap_mode="r")
+    datos = np.load(ruta + ".utf8.npy", mmap_mode="r")
+    nulos = np.load(ruta + ".nulos.npy", mmap_mode="r")
+    crudo = datos.tobytes()
+    valores = np.array([
+        None if nulo else crudo[inicio:fin].decode("utf-8")
+        for inicio, fin, nulo in zip(offsets[:-1], offsets[1:], nulos)
+    ], dtype=object)
+    return pd.array(valores, dtype="str")
+
+
+def publicar(nombre, data, version, directorio):
+    """Escribe `data` como versión `version` del dataset `nombre` y la marca como actual de forma atómica."""
+    base = os.path.join(directorio, nombre)
+    destino = os.path.join(base, version)
+    if not os.path.isdir(destino):
+        temporal = os.path.join(base, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(temporal)
+        esquema = []
+        for n, columna in enumerate(data.columns):
+            serie = data[columna]
+            ruta = os.path.join(temporal, str(n))
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                np.save(ruta + ".npy", serie.cat.codes.to_numpy())
+                esquema.append({"nombre": columna, "tipo": "categoria",
+                                "categorias": [str(c) for c in serie.cat.categories]})
+            elif isinstance(serie.dtype, pd.api.extensions.ExtensionDtype) and serie.dtype.kind in "iuf":
+                # Enteros con nulos (p. ej. CP como UInt16): valores + máscara
+                np.save(ruta + ".npy", serie.to_numpy(dtype=serie.dtype.numpy_dtype, na_value=0))
+                np.save(ruta + ".nulos.npy", serie.isna().to_numpy())
+                esquema.append({"nombre": columna, "tipo": "nullable", "dtype": str(serie.dtype)})
+            elif serie.dtype.kind in "biuf":
+                np.save(ruta + ".npy", serie.to_numpy())
+                esquema.append({"nombre": columna, "tipo": "numerico"})
+            else:
+                _guardar_textos(ruta, serie)
+                esquema.append({"nombre": columna, "tipo": "texto"})
+        with open(os.path.join(temporal, "esquema.json"), "w", encoding="utf-8") as f:
+            json.dump({"version": version, "filas": len(data), "columnas": esquema}, f, ensure_ascii=False)
+        try:
+            os.rename(temporal, destino)
+        except OSError:
+            # Otro proceso ha publicado la misma versión a la vez: se usa la suya
+            shutil.rmtree(temporal, ignore_errors=True)
+
+    with escritura_atomica(os.path.join(base, "ACTUAL")) as f:
+        f.write(version)
+    return destino
+
+
+def version_actual(nombre, directorio):
+    """Versión publicada del dataset `nombre`, o None si todavía no se ha publicado ninguna."""
+    try:
+        with open(os.path.join(directorio, nombre, "ACTUAL"), encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def abrir(nombre, version, directorio):
+    """DataFrame de solo lectura sobre los arrays mapeados en memoria de una versión publicada."""
+    ruta_version = os.path.join(directorio, nombre, version)
+    with open(os.path.join(ruta_version, "esquema.json"), encoding="utf-8") as f:
+        esquema = json.load(f)
+    columnas = {}
+    for n, columna in enumerate(esquema["columnas"]):
+        ruta = os.path.join(ruta_version, str(n))
+        if columna["tipo"] == "texto":
+            columnas[columna["nombre"]] = _leer_textos(ruta)
+            continue
+        valores = np.load(ruta + ".npy", mmap_mode="r")
+        if columna["tipo"] == "categoria":
+            dtype = pd.CategoricalDtype(columna["categorias"])
+            columnas[columna["nombre"]] = pd.Categorical.from_codes(valores, dtype=dtype, validate=False)
+        elif columna["tipo"] == "nullable":
+            nulos = np.load(ruta + ".nulos.npy", mmap_mode="r")
+            columnas[columna["nombre"]] = pd.array(np.asarray(valores), dtype=columna["dtype"]).copy()
+            columnas[columna["nombre"]][np.asarray(nulos)] = pd.NA
+        else:
+            columnas[columna["nombre"]] = valores
+    return pd.DataFrame(columnas, copy=False)
+
+
+def limpiar(nombre, directorio, conservar=2):
+    """Borra las versiones más antiguas de `nombre`, conservando la actual y las `conservar` más recientes."""
+    base = os.path.join(directorio, nombre)
+    actual = version_actual(nombre, directorio)
+    versiones = sorted(
+        (nombre for nombre in os.listdir(base)
+         if not nombre.startswith(".") and nombre != "ACTUAL" and nombre != actual),
+        key=lambda nombre: os.path.getmtime(os.path.join(base, nombre)),
+    )
+    for nombre in versiones[:max(len(versiones) - conservar, 0)]:
+        shutil.rmtree(os.path.join(base, nombre), ignore_errors=True)
+
+
+class DatasetsCompartidos:
+    """Versión actual de cada dataset en este proceso; cambia de versión cuando se publica otra."""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self._abiertos = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, nombre):
+        """Devuelve (versión, DataFrame compartido) de la versión publicada de `nombre`."""
+        version = version_actual(nombre, self.directorio)
+        if version is None:
+            raise KeyError(f"No hay ninguna versión publicada de {nombre} en {self.directorio}")
+        abierto = self._abiertos.get(nombre)
+        if abierto is None or abierto[0] != version:
+            with self._lock:
+                abierto = self._abiertos.get(nombre)
+                if abierto is None or abierto[0] != version:
+                    # Se sustituye la referencia entera: quien tenga la versión anterior la sigue viendo completa
+                    abierto = (version, abrir(nombre, version, self.directorio))
+                    self._abiertos[nombre] = abierto
+        return abierto
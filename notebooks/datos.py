@@ -0,0 +1,223 @@
+"""
+Capa de datos compartida por la app de Streamlit y los notebooks del pipeline.
+
+Todas las lecturas de inmuebles pasan por `compactar_inmuebles`, que deja cada
+DataFrame en una representación compacta:
+
+- Columnas de texto repetitivas (localización, tipo de casa, conservación,
+  antigüedad, planta, ...) como `category`, con diccionarios compartidos entre
+  venta y alquiler para que los códigos signifiquen lo mismo en ambas tablas.
+- Columnas numéricas reducidas a float32 (precio, superficies, habitaciones...).
+- Código postal como entero `uint16` (28013 cabe de sobra en 16 bits).
+- Las ~25 columnas one-hot `Planta_*` de los ficheros escalados se colapsan en
+  una única columna `Planta` categórica (1 byte por inmueble).
+
+Columnas con un valor distinto por anuncio (`Id`, `Enlace`, `Descripción`,
+`timestamp_scrapeo`) no ganan nada como categoría y se dejan como texto.
+
+Medido con pandas 3.0.6 (textos con el tipo `str` sobre pyarrow) sobre los CSV
+de `docs/` (bytes por inmueble, deep=True):
+
+    inmuebles_venta_procesado_escalado.csv     554 B  ->  255 B   (46 %)
+    inmuebles_alquiler_procesado_escalado.csv  482 B  ->  282 B   (58 %)
+    inmuebles_venta_con_cp.csv                 459 B  ->  262 B   (57 %)
+    inmuebles_alquiler_cp.csv                  456 B  ->  307 B   (67 %)
+
+Casi todo lo que queda son los textos únicos por anuncio; sin ellos cada
+inmueble ocupa entre 41 y 89 bytes.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Rutas de los CSV que usa la app (relativas al directorio de trabajo)
+RUTAS_DATOS = {
+    "Alquiler": "inmuebles_alquilerconcp.csv",
+    "Venta": "inmueblesventaconcp.csv",
+}
+
+COLUMNAS_NUMERICAS = [
+    "precio", "superficie construida", "habitaciones", "baños",
+    "consumo energético", "emisiones co2",
+]
+
+# Columnas que siempre se guardan como float32 al compactar. Consumo y emisiones
+# quedan fuera: en los CSV crudos son textos ("Consumo:104 kWh/m² año").
+COLUMNAS_FLOAT32 = [
+    "precio", "superficie construida", "superficie útil", "habitaciones", "baños",
+]
+
+# Columnas de texto que se guardan como categoría aunque tengan muchos valores
+COLUMNAS_CATEGORICAS = [
+    "localización", "tipo de casa", "conservación", "antigüedad", "planta",
+    "tipo de operación", "última actualización",
+]
+
+COLUMNAS_CP = ["cp", "codigo_postal"]
+
+# Una columna de texto pasa a categoría si tiene menos de este ratio de valores únicos
+RATIO_CATEGORIA = 0.5
+
+# Diccionarios compartidos: nombre de columna (en minúsculas) -> categorías conocidas.
+# Solo se añaden valores al final, así un código nunca cambia de significado.
+DICCIONARIOS = {}
+
+
+def _categorizar(serie, nombre):
+    """Convierte una serie a `category` usando (y ampliando) el diccionario compartido."""
+    conocidas = DICCIONARIOS.setdefault(nombre, [])
+    nuevas = set(serie.dropna().astype(str).unique()) - set(conocidas)
+    conocidas.extend(sorted(nuevas))
+    return pd.Categorical(serie.where(serie.isna(), serie.astype(str)), categories=conocidas)
+
+
+def _codificar_cp(serie):
+    """Extrae el código postal de 5 dígitos y lo guarda como entero de 16 bits."""
+    if pd.api.types.is_numeric_dtype(serie):
+        cp = serie
+    else:
+        cp = pd.to_numeric(serie.astype(str).str.extract(r"(\d{5})")[0], errors="coerce")
+    if cp.isna().any():
+        return cp.astype("UInt16")
+    return cp.astype("uint16")
+
+
+def colapsar_planta(df):
+    """Sustituye las columnas one-hot `Planta_*` por una única columna `Planta` categórica."""
+    columnas_planta = [col for col in df.columns if col.startswith("Planta_")]
+    if not columnas_planta:
+        return df
+    one_hot = df[columnas_planta].to_numpy()
+    valores = np.array([col[len("Planta_"):] for col in columnas_planta], dtype=object)
+    planta = pd.Series(valores[one_hot.argmax(axis=1)], index=df.index)
+    # Filas sin ningún 1 (categoría descartada por el encoder) quedan sin planta
+    planta[one_hot.max(axis=1) == 0] = np.nan
+    df = df.drop(columns=columnas_planta)
+    df["Planta"] = _categorizar(planta, "planta")
+    return df
+
+
+def expandir_planta(df, columnas_planta):
+    """Reconstruye las columnas one-hot `Planta_*` (float32) a partir de la columna `Planta`."""
+    planta = df["Planta"].astype(object)
+    one_hot = {
+        col: (planta == col[len("Planta_"):]).to_numpy(dtype=np.float32)
+        for col in columnas_planta
+    }
+    return pd.DataFrame(one_hot, index=df.index)
+
+
+def compactar_inmuebles(df):
+    """Devuelve una copia del DataFrame con tipos compactos (categorías, float32, CP entero)."""
+    df = colapsar_planta(df.copy())
+    for col in df.columns:
+        nombre = col.lower().strip()
+        serie = df[col]
+        if nombre in COLUMNAS_CP:
+            df[col] = _codificar_cp(serie)
+        elif nombre in COLUMNAS_FLOAT32 or nombre.endswith("_encoded"):
+            df[col] = pd.to_numeric(serie, errors="coerce").astype("float32")
+        elif pd.api.types.is_float_dtype(serie):
+            df[col] = serie.astype("float32")
+        elif pd.api.types.is_integer_dtype(serie):
+            df[col] = pd.to_numeric(serie, downcast="integer")
+        elif isinstance(serie.dtype, pd.CategoricalDtype):
+            continue
+        elif nombre in COLUMNAS_CATEGORICAS or serie.nunique() < RATIO_CATEGORIA * len(serie):
+            df[col] = _categorizar(serie, nombre)
+    return df
+
+
+def bytes_por_inmueble(df):
+    """Memoria real (incluyendo textos) que ocupa cada inmueble del DataFrame."""
+    if df.empty:
+        return 0.0
+    return df.memory_usage(deep=True).sum() / len(df)
+
+
+def años_antiguedad(serie):
+    """Primer número de cada texto de antigüedad ("Entre 10 y 20 años" -> 10) como float32."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Basta con parsear las pocas categorías y reutilizar los códigos
+        categorias = serie.cat.categories.to_series().astype(str).str.extract(r"(\d+)")[0]
+        años = pd.to_numeric(categorias, errors="coerce").to_numpy(dtype=np.float32)
+        codigos = serie.cat.codes.to_numpy()
+        return pd.Series(np.where(codigos >= 0, años[codigos], np.nan), index=serie.index, dtype="float32")
+    años = serie.astype(str).str.extract(r"(\d+)")[0]
+    return pd.to_numeric(años, errors="coerce").astype("float32")
+
+
+def version_datos(tipo):
+    """Identificador de la versión del CSV (fecha de modificación y tamaño), o None si no existe."""
+    try:
+        estado = os.stat(RUTAS_DATOS[tipo])
+    except FileNotFoundError:
+        return None
+    return f"{estado.st_mtime_ns:x}-{estado.st_size:x}"
+
+
+def leer_inmuebles(tipo):
+    """Lee el CSV de alquiler o venta, normaliza columnas y lo devuelve compactado."""
+    data = pd.read_csv(RUTAS_DATOS[tipo])
+    data.columns = data.columns.str.lower().str.strip()
+
+    # Convertir columnas a tipo numérico
+    for columna in COLUMNAS_NUMERICAS:
+        if columna in data.columns:
+            data[columna] = pd.to_numeric(data[columna], errors="coerce")
+
+    # Algunos CSV de alquiler llaman 'codigo_postal' a la columna del CP
+    if "cp" not in data.columns and "codigo_postal" in data.columns:
+        data = data.rename(columns={"codigo_postal": "cp"})
+
+    if "cp" in data.columns:
+        data["cp"] = _codificar_cp(data["cp"])
+        data = data.dropna(subset=["cp"])  # Eliminar filas con 'cp' nulo
+
+    data = compactar_inmuebles(data)
+
+    # Antigüedad en años, parseada una sola vez para los gráficos
+    if "antigüedad" in data.columns:
+        data["años antigüedad"] = años_antiguedad(data["antigüedad"])
+
+    return data
+
+
+def filtrar_inmuebles(data, precio_min=None, precio_max=None, habitaciones=None, baños=None, cps=None, texto=None):
+    """Aplica los mismos filtros que la barra lateral de la app (los None no filtran)."""
+    mascara = np.ones(len(data), dtype=bool)
+    if precio_min is not None:
+        mascara &= (data["precio"] >= precio_min).to_numpy()
+    if precio_max is not None:
+        mascara &= (data["precio"] <= precio_max).to_numpy()
+    if habitaciones is not None:
+        mascara &= (data["habitaciones"] == habitaciones).to_numpy()
+    if baños is not None:
+        mascara &= (data["baños"] == baños).to_numpy()
+    if cps:
+        mascara &= data["cp"].isin(cps).to_numpy()
+    if texto:
+        # Búsqueda sin distinguir mayúsculas en descripción y localización
+        encontrado = np.zeros(len(data), dtype=bool)
+        for columna in ["descripción", "localización"]:
+            if columna not in data.columns:
+                continue
+            serie = data[columna]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                # Basta con buscar en el diccionario de categorías
+                categorias = serie.cat.categories
+                encontrado |= serie.isin(categorias[categorias.str.contains(texto, case=False, regex=False)]).to_numpy()
+            else:
+                encontrado |= serie.astype(str).str.contains(texto, case=False, regex=False).to_numpy()
+        mascara &= encontrado
+    return data[mascara]
+
+
+def agregados_por_cp(data):
+    """Número de inmuebles y precio medio/mediano por código postal."""
+    return (
+        data.groupby("cp", observed=True)["precio"]
+        .agg(cantidad="size", precio_medio="mean", precio_mediano="median")
+        .reset_index()
+    )
@@ -0,0 +1,183 @@
+"""
+Trabajos de entrenamiento en segundo plano para la página "Modelo de Clasificación".
+
+Antes el escalado y el `RandomForestClassifier` se ajustaban dentro de la
+petición de Streamlit al pulsar "Entrenar Modelo": la sesión quedaba bloqueada,
+se usaba un solo núcleo y `modelo_clasificacion.pkl` se sobrescribía en el
+directorio de trabajo.
+
+`GestorEntrenamientos` recibe los datos y lanza el trabajo en un hilo aparte,
+que reparte la búsqueda de hiperparámetros × particiones de validación cruzada
+entre todos los núcleos con joblib. Cada ajuste terminado actualiza el progreso
+del trabajo, que la app consulta en cada rerun. Al acabar se reentrena el mejor
+modelo (escalado + bosque, en un `Pipeline`) con todo el conjunto de
+entrenamiento y se guarda como artefacto versionado:
+
+    modelos_clasificacion/<versión>.pkl
+    modelos_clasificacion/ACTUAL      versión en uso (se sustituye con os.replace)
+
+La app carga siempre la versión de `ACTUAL`; cambiar de modelo es atómico y
+las versiones anteriores se conservan.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+from dataset_compartido import escritura_atomica
+
+DIRECTORIO_MODELOS = "modelos_clasificacion"
+
+ESCALADORES = {"StandardScaler": StandardScaler, "MinMaxScaler": MinMaxScaler}
+
+REJILLA_PARAMETROS = {
+    "modelo__n_estimators": [100, 200],
+    "modelo__max_depth": [None, 10, 20],
+    "modelo__min_samples_leaf": [1, 5],
+}
+
+PARTICIONES_CV = 5
+
+
+def _pipeline(escalador):
+    return Pipeline([
+        ("escalador", ESCALADORES[escalador]()),
+        # n_jobs=1: el paralelismo está en la búsqueda, no dentro de cada bosque
+        ("modelo", RandomForestClassifier(random_state=42, n_jobs=1)),
+    ])
+
+
+def _ajustar(pipeline, parametros, X, y, entrenamiento, validacion):
+    modelo = clone(pipeline).set_params(**parametros)
+    modelo.fit(X[entrenamiento], y[entrenamiento])
+    return parametros, accuracy_score(y[validacion], modelo.predict(X[validacion]))
+
+
+class TrabajoEntrenamiento:
+    """Estado de un trabajo; lo escribe el hilo de entrenamiento y lo lee la app."""
+
+    def __init__(self, id_trabajo, total):
+        self.id = id_trabajo
+        self.estado = "en cola"  # en cola / entrenando / terminado / error
+        self.completados = 0
+        self.total = total
+        self.mejor_puntuacion = None
+        self.mejores_parametros = None
+        self.puntuacion_prueba = None
+        self.version = None
+        self.error = None
+        self.inicio = None
+        self.fin = None
+
+    @property
+    def progreso(self):
+        return self.completados / self.total if self.total else 0.0
+
+    @property
+    def activo(self):
+        return self.estado in ("en cola", "entrenando")
+
+
+def guardar_modelo(modelo, metadatos, directorio=DIRECTORIO_MODELOS):
+    """Guarda el modelo como versión nueva y la marca como actual de forma atómica. Devuelve la versión."""
+    os.makedirs(directorio, exist_ok=True)
+    version = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+    with escritura_atomica(os.path.join(directorio, f"{version}.pkl"), "wb") as f:
+        joblib.dump({"modelo": modelo, **metadatos, "version": version}, f)
+    with escritura_atomica(os.path.join(directorio, "ACTUAL")) as f:
+        f.write(version)
+    return version
+
+
+def version_modelo_actual(directorio=DIRECTORIO_MODELOS):
+    """Versión del modelo en uso, o None si todavía no se ha entrenado ninguno."""
+    try:
+        with open(os.path.join(directorio, "ACTUAL"), encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def cargar_modelo(version, directorio=DIRECTORIO_MODELOS):
+    """Artefacto guardado por `guardar_modelo`: dict con 'modelo', 'version' y métricas."""
+    return joblib.load(os.path.join(directorio, f"{version}.pkl"))
+
+
+class GestorEntrenamientos:
+    """Cola de trabajos de entrenamiento, uno a la vez, cada uno usando todos los núcleos."""
+
+    def __init__(self, directorio=DIRECTORIO_MODELOS, n_jobs=-1):
+        self.directorio = directorio
+        self.n_jobs = n_jobs
+        self.trabajos = {}
+        self._ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="entrenamiento")
+        self._lock = threading.Lock()
+
+    def lanzar(self, X_train, y_train, X_test=None, y_test=None, escalador="StandardScaler",
+               rejilla=REJILLA_PARAMETROS, particiones=PARTICIONES_CV):
+        """Encola un trabajo y devuelve su id sin esperar a que termine."""
+        combinaciones = list(ParameterGrid(rejilla))
+        trabajo = TrabajoEntrenamiento(uuid.uuid4().hex[:8], len(combinaciones) * particiones)
+        with self._lock:
+            self.trabajos[trabajo.id] = trabajo
+        self._ejecutor.submit(
+            self._entrenar, trabajo, np.asarray(X_train), np.asarray(y_train),
+            X_test, y_test, escalador, combinaciones, particiones,
+        )
+        return trabajo.id
+
+    def trabajo(self, id_trabajo):
+        return self.trabajos.get(id_trabajo)
+
+    def _entrenar(self, trabajo, X, y, X_test, y_test, escalador, combinaciones, particiones):
+        trabajo.estado = "entrenando"
+        trabajo.inicio = time.time()
+        try:
+            pipeline = _pipeline(escalador)
+            cv = StratifiedKFold(n_splits=particiones, shuffle=True, random_state=42)
+            tareas = (
+                delayed(_ajustar)(pipeline, parametros, X, y, entrenamiento, validacion)
+                for parametros in combinaciones
+                for entrenamiento, validacion in cv.split(X, y)
+            )
+            puntuaciones = {}
+            # Resultados según terminan, para ir actualizando el progreso
+            for parametros, puntuacion in Parallel(n_jobs=self.n_jobs, return_as="generator_unordered")(tareas):
+                puntuaciones.setdefault(tuple(sorted(parametros.items())), []).append(puntuacion)
+                trabajo.completados += 1
+
+            mejores, resultados = max(puntuaciones.items(), key=lambda item: np.mean(item[1]))
+            trabajo.mejores_parametros = dict(mejores)
+            trabajo.mejor_puntuacion = float(np.mean(resultados))
+
+            modelo = clone(pipeline).set_params(**trabajo.mejores_parametros, modelo__n_jobs=self.n_jobs)
+            modelo.fit(X, y)
+            # El artefacto se guarda con n_jobs=1: quien lo cargue (la app) no debe ocupar todos los núcleos
+            modelo.set_params(modelo__n_jobs=1)
+            if X_test is not None and y_test is not None:
+                trabajo.puntuacion_prueba = float(accuracy_score(y_test, modelo.predict(np.asarray(X_test))))
+
+            trabajo.version = guardar_modelo(modelo, {
+                "escalador": escalador,
+                "parametros": trabajo.mejores_parametros,
+                "puntuacion_cv": trabajo.mejor_puntuacion,
+                "puntuacion_prueba": trabajo.puntuacion_prueba,
+            }, self.directorio)
+            trabajo.estado = "terminado"
+        except Exception as e:
+            trabajo.error = str(e)
+            trabajo.estado = "error"
+        finally:
+            trabajo.fin = time.time()
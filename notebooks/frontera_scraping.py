@@ -0,0 +1,320 @@
+"""
+Frontera de scraping persistente y reanudable para pisos.com.
+
+El scraping del notebook (`scraepo_venta.ipynb`) empieza siempre desde la
+primera página de listados, guarda todo en `all_data` hasta el final y lo
+pierde si el navegador se cae. Aquí el estado vive en una base SQLite:
+
+- `paginas`: páginas de listado de la ronda actual (pendiente / visitada).
+- `anuncios`: URL de cada anuncio con la huella de su tarjeta en el listado
+  (precio + fecha de actualización), el ETag/Last-Modified de su ficha, si la
+  ficha está pendiente de visitar y los intentos fallidos de descargarla.
+
+Una ficha solo se vuelve a descargar si la tarjeta del listado muestra un
+precio o una fecha distintos, o si el servidor no responde 304 a la petición
+condicional. Así el coste de un re-scrapeo es proporcional a los anuncios que
+han cambiado. Los registros parseados se escriben en el CSV por lotes, y la
+ficha se marca como visitada después de escribirse, así que tras una caída se
+continúa por donde se quedó.
+
+Una ficha que responde 404/410 (anuncio retirado) se marca como `retirado` y
+deja de estar pendiente; con cualquier otro error se reintenta en las
+siguientes ejecuciones hasta `MAX_INTENTOS` veces. Así una URL rota no deja la
+ronda a medias para siempre. Si la tarjeta vuelve a cambiar, la ficha vuelve a
+estar pendiente con los intentos a cero.
+
+Uso (con `descargar_http` o una función equivalente que use Selenium):
+
+    frontera = FronteraScraping("frontera_venta.db")
+    rastrear(frontera, "https://www.pisos.com/venta/pisos-madrid/", "inmuebles_venta.csv")
+
+`prueba_frontera.py` lo comprueba contra un servidor local de páginas de
+ejemplo (reanudación tras una caída, tarjetas que cambian, respuestas 304 y
+fichas retiradas o que fallan).
+"""
+import csv
+import os
+import sqlite3
+import uuid
+from datetime import datetime
+from urllib.error import HTTPError
+from urllib.parse import urljoin
+from urllib.request import Request, urlopen
+
+from bs4 import BeautifulSoup as bs
+
+TAMAÑO_LOTE = 50
+MAX_INTENTOS = 3
+ESTADOS_RETIRADO = (404, 410)
+
+# Selectores del listado de pisos.com
+SELECTOR_TARJETA = "div.ad-preview"
+SELECTOR_PRECIO_TARJETA = ".ad-preview__price"
+SELECTOR_FECHA_TARJETA = ".ad-preview__date"
+SELECTOR_SIGUIENTE = "a.pagination__next, .pagination__next a"
+
+COLUMNAS_CSV = [
+    "id", "Descripción", "Localización", "Enlace", "Precio", "Superficie Construida",
+    "Última Actualización", "Consumo Energético", "Emisiones CO2", "Características",
+    "Tipo de operación", "timestamp_scrapeo",
+]
+
+
+class FronteraScraping:
+    """Estado persistente del scraping (páginas de listado y fichas de anuncios)."""
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS paginas (
+                url TEXT PRIMARY KEY,
+                visitada INTEGER DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS anuncios (
+                url TEXT PRIMARY KEY,
+                huella_tarjeta TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                pendiente INTEGER DEFAULT 1,
+                visitado_en TEXT,
+                intentos INTEGER DEFAULT 0,
+                retirado INTEGER DEFAULT 0
+            );
+        """)
+        # Bases creadas antes de contar los intentos
+        columnas = {fila[1] for fila in self.conn.execute("PRAGMA table_info(anuncios)")}
+        for columna in ["intentos", "retirado"]:
+            if columna not in columnas:
+                self.conn.execute(f"ALTER TABLE anuncios ADD COLUMN {columna} INTEGER DEFAULT 0")
+        self.conn.commit()
+
+    # --- Páginas de listado ---
+
+    def iniciar_ronda(self, url_inicial):
+        """Empieza una ronda nueva salvo que haya una a medias, que entonces se reanuda."""
+        pendientes = self.conn.execute(
+            "SELECT COUNT(*) FROM paginas WHERE visitada = 0"
+        ).fetchone()[0] + self.conn.execute(
+            "SELECT COUNT(*) FROM anuncios WHERE pendiente = 1"
+        ).fetchone()[0]
+        if pendientes:
+            return False
+        with self.conn:
+            self.conn.execute("DELETE FROM paginas")
+            self.conn.execute("INSERT INTO paginas (url) VALUES (?)", (url_inicial,))
+        return True
+
+    def siguiente_pagina(self):
+        fila = self.conn.execute("SELECT url FROM paginas WHERE visitada = 0 LIMIT 1").fetchone()
+        return fila[0] if fila else None
+
+    def completar_pagina(self, url, tarjetas, url_siguiente=None):
+        """Registra las tarjetas de una página de listado y la marca como visitada, en una transacción."""
+        with self.conn:
+            for tarjeta in tarjetas:
+                self._registrar_tarjeta(tarjeta["url"], tarjeta.get("precio"), tarjeta.get("actualizado"))
+            if url_siguiente:
+                self.conn.execute("INSERT OR IGNORE INTO paginas (url) VALUES (?)", (url_siguiente,))
+            self.conn.execute("UPDATE paginas SET visitada = 1 WHERE url = ?", (url,))
+
+    def _registrar_tarjeta(self, url, precio, actualizado):
+        # Si la tarjeta no ha cambiado desde la última ficha visitada, no hay que volver a entrar
+        huella = f"{precio}|{actualizado}"
+        fila = self.conn.execute("SELECT huella_tarjeta FROM anuncios WHERE url = ?", (url,)).fetchone()
+        if fila is None:
+            self.conn.execute("INSERT INTO anuncios (url, huella_tarjeta) VALUES (?, ?)", (url, huella))
+        elif fila[0] != huella:
+            self.conn.execute(
+                "UPDATE anuncios SET huella_tarjeta = ?, pendiente = 1, intentos = 0, retirado = 0 WHERE url = ?",
+                (huella, url),
+            )
+
+    # --- Fichas de anuncios ---
+
+    def anuncios_pendientes(self, limite=TAMAÑO_LOTE):
+        filas = self.conn.execute(
+            "SELECT url FROM anuncios WHERE pendiente = 1 LIMIT ?", (limite,)
+        ).fetchall()
+        return [fila[0] for fila in filas]
+
+    def cabeceras_condicionales(self, url):
+        """Cabeceras If-None-Match / If-Modified-Since guardadas de la última descarga."""
+        fila = self.conn.execute("SELECT etag, last_modified FROM anuncios WHERE url = ?", (url,)).fetchone()
+        cabeceras = {}
+        if fila and fila[0]:
+            cabeceras["If-None-Match"] = fila[0]
+        if fila and fila[1]:
+            cabeceras["If-Modified-Since"] = fila[1]
+        return cabeceras
+
+    def completar_anuncios(self, visitados):
+        """Marca como visitadas las fichas [(url, etag, last_modified), ...] en una transacción."""
+        ahora = datetime.now().isoformat()
+        with self.conn:
+            # Un 304 no suele repetir ETag/Last-Modified: si no vienen se conservan los guardados
+            self.conn.executemany(
+                "UPDATE anuncios SET pendiente = 0, intentos = 0, etag = COALESCE(?, etag), "
+                "last_modified = COALESCE(?, last_modified), visitado_en = ? WHERE url = ?",
+                [(etag, last_modified, ahora, url) for url, etag, last_modified in visitados],
+            )
+
+    def registrar_fallo(self, url, retirado=False):
+        """Anota un intento fallido; la ficha deja de estar pendiente si está retirada o agota los intentos."""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE anuncios SET intentos = intentos + 1, retirado = ?, "
+                "pendiente = CASE WHEN ? OR intentos + 1 >= ? THEN 0 ELSE 1 END WHERE url = ?",
+                (int(retirado), int(retirado), MAX_INTENTOS, url),
+            )
+
+    def cerrar(self):
+        self.conn.close()
+
+
+def descargar_http(url, cabeceras=None):
+    """GET con cabeceras condicionales. Devuelve (estado, html, cabeceras de respuesta)."""
+    peticion = Request(url, headers={"User-Agent": "Mozilla/5.0", **(cabeceras or {})})
+    try:
+        with urlopen(peticion, timeout=30) as respuesta:
+            return respuesta.status, respuesta.read().decode("utf-8", errors="replace"), dict(respuesta.headers)
+    except HTTPError as e:
+        if e.code == 304:
+            return 304, None, dict(e.headers)
+        raise
+
+
+def parsear_listado(html, url):
+    """Tarjetas (url, precio, fecha) de una página de listado y URL de la página siguiente."""
+    soup = bs(html, "lxml")
+    tarjetas = []
+    for tarjeta in soup.select(SELECTOR_TARJETA):
+        enlace = tarjeta.get("data-lnk-href") or (tarjeta.find("a", href=True) or {}).get("href")
+        if not enlace:
+            continue
+        precio = tarjeta.select_one(SELECTOR_PRECIO_TARJETA)
+        fecha = tarjeta.select_one(SELECTOR_FECHA_TARJETA)
+        tarjetas.append({
+            "url": urljoin(url, enlace),
+            "precio": precio.get_text(strip=True) if precio else None,
+            "actualizado": fecha.get_text(strip=True) if fecha else None,
+        })
+    siguiente = soup.select_one(SELECTOR_SIGUIENTE)
+    return tarjetas, urljoin(url, siguiente["href"]) if siguiente and siguiente.get("href") else None
+
+
+def parsear_ficha(html, url, tipo_operacion="compra"):
+    """Mismos campos que `extraer_datos_inmueble` del notebook de scraping.
+
+    El id se deriva de la URL: si una ficha se vuelve a escribir (anuncio que ha
+    cambiado, o lote escrito justo antes de una caída) conserva el mismo id y se
+    puede deduplicar quedándose con el último `timestamp_scrapeo`.
+    """
+    soup = bs(html, "lxml")
+    descripcion = soup.find("h1").text.strip() if soup.find("h1") else "Descripción no disponible"
+    localizacion = soup.find("p").text.strip() if soup.find("p") else "Localización no disponible"
+
+    precio_element = soup.find("div", {"class": "price__value jsPriceValue"})
+    precio = precio_element.text.split(" ")[0] if precio_element else "N/A"
+
+    superficie_element = soup.find("span", {"class": "features__value"})
+    superficie_construida = superficie_element.text.split(" ")[0] if superficie_element else "N/A"
+
+    ultima_actualizacion_element = soup.find("p", {"class": "last-update__date"})
+    ultima_actualizacion = ultima_actualizacion_element.text if ultima_actualizacion_element else "N/A"
+
+    features_list = "N/A"
+    c1 = soup.find("div", {"class": "features__content"})
+    if c1:
+        features_list = []
+        for feature in c1.find_all("div", {"class": "features__feature"}):
+            label = feature.find("span", {"class": "features__label"})
+            value = feature.find("span", {"class": "features__value"})
+            if label and value:
+                features_list.append((label.get_text(strip=True), value.get_text(strip=True)))
+
+    consumo = emisiones = "N/A"
+    energy_certificate = soup.find("div", {"class": "details__block energy-certificate"})
+    if energy_certificate:
+        datos_energia = energy_certificate.find_all("div", {"class": "energy-certificate__data"})
+        if datos_energia:
+            consumo = datos_energia[0].find_all("span")[1].get_text(strip=True)
+        if len(datos_energia) > 1:
+            emisiones = datos_energia[1].find_all("span")[1].get_text(strip=True)
+
+    return {
+        "id": str(uuid.uuid5(uuid.NAMESPACE_URL, url)),
+        "Descripción": descripcion,
+        "Localización": localizacion,
+        "Enlace": url,
+        "Precio": precio,
+        "Superficie Construida": superficie_construida,
+        "Última Actualización": ultima_actualizacion,
+        "Consumo Energético": consumo,
+        "Emisiones CO2": emisiones,
+        "Características": features_list,
+        "Tipo de operación": tipo_operacion,
+        "timestamp_scrapeo": datetime.now().isoformat(),
+    }
+
+
+def _escribir_lote(ruta_csv, registros):
+    # Se añade al CSV y se fuerza a disco antes de marcar las fichas como visitadas
+    nuevo = not os.path.exists(ruta_csv)
+    with open(ruta_csv, "a", newline="", encoding="utf-8") as f:
+        escritor = csv.DictWriter(f, fieldnames=COLUMNAS_CSV)
+        if nuevo:
+            escritor.writeheader()
+        escritor.writerows(registros)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def rastrear(frontera, url_inicial, ruta_csv, descargar=descargar_http, tipo_operacion="compra",
+             max_anuncios=None):
+    """
+    Recorre los listados y descarga solo las fichas nuevas o cambiadas.
+
+    Devuelve un resumen con las páginas de listado, fichas descargadas y fichas
+    sin cambios (304). Se puede volver a llamar tras una caída: continúa la ronda.
+    """
+    resumen = {"paginas": 0, "fichas": 0, "sin_cambios": 0}
+    frontera.iniciar_ronda(url_inicial)
+
+    url = frontera.siguiente_pagina()
+    while url:
+        _, html, _ = descargar(url)
+        tarjetas, siguiente = parsear_listado(html, url)
+        frontera.completar_pagina(url, tarjetas, siguiente)
+        resumen["paginas"] += 1
+        url = frontera.siguiente_pagina()
+
+    fallidas = set()  # No se reintentan en esta ejecución (hasta MAX_INTENTOS ejecuciones)
+    while max_anuncios is None or resumen["fichas"] < max_anuncios:
+        pendientes = [url for url in frontera.anuncios_pendientes(TAMAÑO_LOTE + len(fallidas))
+                      if url not in fallidas]
+        if not pendientes:
+            break
+        registros, visitados = [], []
+        for url in pendientes:
+            try:
+                estado, html, cabeceras = descargar(url, frontera.cabeceras_condicionales(url))
+            except Exception as e:
+                # HTTPError (o el error equivalente de otro `descargar`) con el código de estado en `code`
+                retirado = getattr(e, "code", None) in ESTADOS_RETIRADO
+                print(f"{'Anuncio retirado' if retirado else 'Error al descargar la ficha'} {url}: {e}")
+                frontera.registrar_fallo(url, retirado)
+                fallidas.add(url)
+                continue
+            if estado == 304:
+                resumen["sin_cambios"] += 1
+            else:
+                registros.append(parsear_ficha(html, url, tipo_operacion))
+            cabeceras = {nombre.lower(): valor for nombre, valor in (cabeceras or {}).items()}
+            visitados.append((url, cabeceras.get("etag"), cabeceras.get("last-modified")))
+
+        if registros:
+            _escribir_lote(ruta_csv, registros)
+        frontera.completar_anuncios(visitados)
+        resumen["fichas"] += len(registros)
+
+    return resumen
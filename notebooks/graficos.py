@@ -0,0 +1,110 @@
+"""
+Datos pre-agregados y caché de figuras para la "Vista para Usuarios".
+
+Los gráficos ya no se construyen a partir de las filas en cada rerun: primero se
+resumen con NumPy (conteos por bin para el histograma, cuantiles por antigüedad
+para el boxplot) y la figura terminada se guarda en una caché LRU con clave
+(versión del dataset, tipo, tupla de filtros, gráfico). Volver a un estado de
+filtros ya visitado solo cuesta una búsqueda en la caché.
+"""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+
+def histograma(valores, nbins=50):
+    """Conteos y bordes de `nbins` intervalos iguales, ignorando NaN."""
+    valores = np.asarray(valores, dtype=np.float64)
+    valores = valores[~np.isnan(valores)]
+    if valores.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(1)
+    return np.histogram(valores, bins=nbins)
+
+
+def cuantiles_por_grupo(grupos, valores):
+    """
+    Estadísticos de boxplot (Q1, mediana, Q3 y vallas de Tukey) por grupo.
+
+    Ordena una sola vez por (grupo, valor) y calcula todos los cuantiles con
+    índices sobre el array ordenado, sin bucles en Python.
+    """
+    grupos = np.asarray(grupos, dtype=np.float64)
+    valores = np.asarray(valores, dtype=np.float64)
+    validos = ~(np.isnan(grupos) | np.isnan(valores))
+    grupos, valores = grupos[validos], valores[validos]
+    columnas = ["grupo", "n", "q1", "mediana", "q3", "valla_inferior", "valla_superior"]
+    if valores.size == 0:
+        return pd.DataFrame(columns=columnas)
+
+    orden = np.lexsort((valores, grupos))
+    grupos, valores = grupos[orden], valores[orden]
+    claves, inicios, conteos = np.unique(grupos, return_index=True, return_counts=True)
+
+    def cuantil(q):
+        # Interpolación lineal, igual que np.quantile / plotly
+        posicion = inicios + q * (conteos - 1)
+        bajo = np.floor(posicion).astype(np.int64)
+        alto = np.ceil(posicion).astype(np.int64)
+        return valores[bajo] + (valores[alto] - valores[bajo]) * (posicion - bajo)
+
+    q1, mediana, q3 = cuantil(0.25), cuantil(0.5), cuantil(0.75)
+    iqr = q3 - q1
+
+    # Vallas: valores extremos dentro de 1.5 * IQR de los cuartiles
+    codigos = np.repeat(np.arange(claves.size), conteos)
+    dentro = (valores >= (q1 - 1.5 * iqr)[codigos]) & (valores <= (q3 + 1.5 * iqr)[codigos])
+    valla_inferior = np.minimum.reduceat(np.where(dentro, valores, np.inf), inicios)
+    valla_superior = np.maximum.reduceat(np.where(dentro, valores, -np.inf), inicios)
+
+    return pd.DataFrame({
+        "grupo": claves,
+        "n": conteos,
+        "q1": q1,
+        "mediana": mediana,
+        "q3": q3,
+        "valla_inferior": valla_inferior,
+        "valla_superior": valla_superior,
+    }, columns=columnas)
+
+
+def figura_histograma(conteos, bordes, titulo="Distribución de Precios", etiqueta_x="Precio (€)"):
+    """Histograma a partir de conteos ya calculados."""
+    fig = go.Figure(go.Bar(
+        x=(bordes[:-1] + bordes[1:]) / 2,
+        y=conteos,
+        width=np.diff(bordes),
+        name=etiqueta_x,
+    ))
+    fig.update_layout(title=titulo, xaxis_title=etiqueta_x, yaxis_title="count", bargap=0)
+    return fig
+
+
+def figura_boxplot(cuantiles, titulo="Distribución de Precios por Antigüedad",
+                   etiqueta_x="Antigüedad (años)", etiqueta_y="Precio (€)"):
+    """Boxplot con una caja (y un color) por grupo, a partir de `cuantiles_por_grupo`."""
+    fig = go.Figure()
+    for fila in cuantiles.itertuples(index=False):
+        grupo = f"{fila.grupo:g}"
+        fig.add_trace(go.Box(
+            x=[grupo],
+            q1=[fila.q1],
+            median=[fila.mediana],
+            q3=[fila.q3],
+            lowerfence=[fila.valla_inferior],
+            upperfence=[fila.valla_superior],
+            name=grupo,
+        ))
+    fig.update_layout(title=titulo, xaxis_title=etiqueta_x, yaxis_title=etiqueta_y, legend_title=etiqueta_x)
+    return fig
+
+
+def figura_dispersion(superficie, precio, cp):
+    """Precio frente a superficie construida, coloreado por código postal."""
+    return px.scatter(
+        x=np.asarray(superficie),
+        y=np.asarray(precio),
+        color=np.asarray(cp).astype(str),
+        title="Relación entre Precio y Superficie Construida por Código Postal",
+        labels={"x": "Superficie Construida (m²)", "y": "Precio (€)", "color": "Código Postal"},
+    )
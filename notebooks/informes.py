@@ -0,0 +1,256 @@
+"""
+Informe de KPIs (PDF y HTML) para la "Vista para Clientes".
+
+Sustituye al `dashboard.pdf` estático, una foto fija del Power BI que no
+cambiaba con los datos. El informe se calcula a partir del cubo de KPIs
+(`cubo.py`), no de los anuncios: resumen por operación y desglose por tipo de
+casa, habitaciones, baños y código postal, con las mismas medidas que
+`docs/dashboard-converted.html` (recuento, precio medio, precio por m²...).
+
+`GestorInformes` genera el informe en un hilo en segundo plano la primera vez
+que ve una versión nueva de los datos y lo guarda por versión. Recibe los cubos
+de cada provincia (los que la app ya tiene en caché) y los combina, así que
+nunca se juntan los anuncios de todas las provincias:
+
+    informes/<versión>.pdf
+    informes/<versión>.html
+
+Cada fichero se escribe con `dataset_compartido.escritura_atomica`, así que
+un fichero con el nombre de la versión siempre está completo. La app solo
+comprueba si existe y sirve los bytes ya generados.
+
+El ETL genera el informe justo después de publicar las particiones
+(`python regiones.py`), con un cubo por operación y provincia leído partición a
+partición; la app solo lo encola si al visitarla aún no existe.
+"""
+import html
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import matplotlib
+matplotlib.use("Agg")  # Sin interfaz gráfica: se dibuja desde un hilo en segundo plano
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+
+from cubo import CuboKPIs
+from dataset_compartido import escritura_atomica
+from datos import version_datos
+from regiones import DIRECTORIO_REGIONES, leer_particion, leer_particiones
+
+DIRECTORIO_INFORMES = "informes"
+FORMATOS = {"pdf": "application/pdf", "html": "text/html"}
+TOP_CODIGOS_POSTALES = 15
+
+DESGLOSES = [
+    ("tipo de casa", "Tipo de casa"),
+    ("habitaciones", "Habitaciones"),
+    ("baños", "Baños"),
+    ("cp", "Código postal"),
+]
+
+
+def version_datos_informe(operaciones=("Venta", "Alquiler")):
+    """Versión del informe (la de cada CSV, "sin-datos" si falta), o None si no hay ningún CSV."""
+    versiones = [version_datos(operacion) or "sin-datos" for operacion in operaciones]
+    if all(version == "sin-datos" for version in versiones):
+        return None
+    return "_".join(versiones)
+
+
+def cubos_particiones(operaciones=("Venta", "Alquiler"), directorio=DIRECTORIO_REGIONES):
+    """Cubo de cada operación y provincia publicadas, leyendo una partición cada vez (para el ETL)."""
+    for operacion in operaciones:
+        for prefijo in leer_particiones(operacion, directorio)["prefijos"]:
+            yield CuboKPIs.construir({operacion: leer_particion(operacion, prefijo, directorio)})
+
+
+def datos_informe(cubo, operaciones=("Venta", "Alquiler")):
+    """Resumen y desgloses de cada operación calculados sobre el cubo."""
+    secciones = []
+    for operacion in operaciones:
+        resumen = cubo.consultar(operacion=operacion)
+        if not resumen["cantidad"]:
+            continue
+        desgloses = {}
+        for dimension, titulo in DESGLOSES:
+            tabla = cubo.agrupar(dimension, operacion=operacion)
+            if dimension in ("habitaciones", "baños"):
+                # -1 = "No especificado" en el cubo
+                tabla = tabla[tabla[dimension] >= 0].sort_values(dimension, ignore_index=True)
+            if dimension == "cp":
+                # CP con cinco dígitos como en el resto de la app (08001, no 8001); 0 = sin código postal
+                tabla = tabla.head(TOP_CODIGOS_POSTALES)
+                tabla["cp"] = [str(int(cp)).zfill(5) if cp else "Sin CP" for cp in tabla["cp"]]
+            desgloses[titulo] = tabla.rename(columns={dimension: titulo})
+        secciones.append({
+            "operacion": operacion,
+            "resumen": resumen,
+            "codigos_postales": int(cubo.celdas.loc[cubo.seleccionar(operacion=operacion), "cp"].nunique()),
+            "desgloses": desgloses,
+        })
+    return secciones
+
+
+def _euros(valor):
+    return f"{valor:,.0f} €".replace(",", ".")
+
+
+def _kpis(seccion):
+    resumen = seccion["resumen"]
+    return [
+        ("Inmuebles", f"{resumen['cantidad']:,}".replace(",", ".")),
+        ("Precio medio", _euros(resumen["precio_medio"])),
+        ("Precio mediano", _euros(resumen["precio_mediano"])),
+        ("Precio medio por m²", _euros(resumen["precio_m2"])),
+        ("Superficie media", f"{resumen['superficie_media']:.0f} m²"),
+        ("Códigos postales", str(seccion["codigos_postales"])),
+    ]
+
+
+def _formatear_tabla(tabla):
+    """Tabla del desglose con las columnas y formatos que se muestran en el informe."""
+    titulo = tabla.columns[0]
+    return [[str(int(valor)) if isinstance(valor, float) else str(valor) for valor in tabla[titulo]],
+            [f"{n:,}".replace(",", ".") for n in tabla["cantidad"]],
+            [_euros(v) for v in tabla["precio_medio"]],
+            [_euros(v) for v in tabla["precio_mediano"]],
+            [_euros(v) for v in tabla["precio_m2"]]]
+
+
+COLUMNAS_TABLA = ["Inmuebles", "Precio medio", "Precio mediano", "Precio por m²"]
+
+
+def informe_html(cubo, version):
+    """Informe completo como página HTML autocontenida."""
+    partes = [f"""<!DOCTYPE html>
+<html lang="es"><head><meta charset="utf-8"><title>Informe de KPIs inmobiliarios</title>
+<style>
+body {{ font-family: Segoe UI, Arial, sans-serif; margin: 2em; color: #222; }}
+.kpis {{ display: flex; flex-wrap: wrap; gap: 1em; margin-bottom: 1.5em; }}
+.kpi {{ border: 1px solid #ddd; border-radius: 6px; padding: 0.8em 1.2em; min-width: 10em; }}
+.kpi b {{ display: block; font-size: 1.4em; }}
+table {{ border-collapse: collapse; margin-bottom: 1.5em; }}
+th, td {{ border-bottom: 1px solid #eee; padding: 0.3em 0.8em; text-align: right; }}
+th:first-child, td:first-child {{ text-align: left; }}
+</style></head><body>
+<h1>Informe de KPIs inmobiliarios</h1>
+<p>Versión de los datos {html.escape(version)} · generado el {datetime.now():%d/%m/%Y %H:%M}</p>
+"""]
+    for seccion in datos_informe(cubo):
+        partes.append(f"<h2>{html.escape(seccion['operacion'])}</h2>\n<div class=\"kpis\">")
+        partes.extend(f"<div class=\"kpi\">{nombre}<b>{html.escape(valor)}</b></div>" for nombre, valor in _kpis(seccion))
+        partes.append("</div>")
+        for titulo, tabla in seccion["desgloses"].items():
+            partes.append(f"<h3>Por {titulo.lower()}</h3>\n<table><tr><th>{titulo}</th>"
+                          + "".join(f"<th>{columna}</th>" for columna in COLUMNAS_TABLA) + "</tr>")
+            for fila in zip(*_formatear_tabla(tabla)):
+                partes.append("<tr>" + "".join(f"<td>{html.escape(celda)}</td>" for celda in fila) + "</tr>")
+            partes.append("</table>")
+    partes.append("</body></html>\n")
+    return "\n".join(partes)
+
+
+def informe_pdf(cubo, version):
+    """Informe completo como PDF: una página por operación con KPIs, gráficos y tablas."""
+    buffer = io.BytesIO()
+    with PdfPages(buffer) as pdf:
+        for seccion in datos_informe(cubo):
+            fig = plt.figure(figsize=(8.27, 11.69))  # A4 vertical
+            fig.suptitle(f"Informe de KPIs inmobiliarios · {seccion['operacion']}", fontsize=14, y=0.98)
+            fig.text(0.5, 0.955, f"Versión de los datos {version} · generado el {datetime.now():%d/%m/%Y %H:%M}",
+                     ha="center", fontsize=8, color="gray")
+            for i, (nombre, valor) in enumerate(_kpis(seccion)):
+                x, y = 0.08 + (i % 3) * 0.3, 0.91 - (i // 3) * 0.045
+                fig.text(x, y, nombre, fontsize=8, color="gray")
+                fig.text(x, y - 0.02, valor, fontsize=12, weight="bold")
+
+            # Precio medio por tipo de casa y por código postal
+            por_tipo = seccion["desgloses"]["Tipo de casa"]
+            ax = fig.add_axes([0.1, 0.63, 0.35, 0.17])
+            ax.barh(por_tipo["Tipo de casa"].astype(str), por_tipo["precio_medio"], color="#4C72B0")
+            ax.set_title("Precio medio por tipo de casa", fontsize=9)
+            ax.tick_params(labelsize=7)
+            ax.invert_yaxis()
+            por_cp = seccion["desgloses"]["Código postal"]
+            ax = fig.add_axes([0.6, 0.63, 0.35, 0.17])
+            ax.barh(por_cp["Código postal"].astype(str), por_cp["cantidad"], color="#55A868")
+            ax.set_title("Códigos postales con más inmuebles", fontsize=9)
+            ax.tick_params(labelsize=7)
+            ax.invert_yaxis()
+
+            posiciones = [[0.05, 0.33, 0.42, 0.25], [0.53, 0.33, 0.42, 0.25],
+                          [0.05, 0.03, 0.42, 0.25], [0.53, 0.03, 0.42, 0.25]]
+            for posicion, (titulo, tabla) in zip(posiciones, seccion["desgloses"].items()):
+                ax = fig.add_axes(posicion)
+                ax.axis("off")
+                ax.set_title(f"Por {titulo.lower()}", fontsize=9)
+                celdas = [list(fila) for fila in zip(*_formatear_tabla(tabla))]
+                if celdas:
+                    tabla_mpl = ax.table(cellText=celdas, colLabels=[titulo] + COLUMNAS_TABLA, loc="upper center")
+                    tabla_mpl.auto_set_font_size(False)
+                    tabla_mpl.set_fontsize(6)
+            pdf.savefig(fig)
+            plt.close(fig)
+    return buffer.getvalue()
+
+
+class GestorInformes:
+    """Genera y guarda los informes de cada versión de los datos en segundo plano."""
+
+    def __init__(self, directorio=DIRECTORIO_INFORMES):
+        self.directorio = directorio
+        self.errores = {}
+        self._en_curso = set()
+        self._ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="informes")
+        self._lock = threading.Lock()
+
+    def ruta(self, version, formato):
+        return os.path.join(self.directorio, f"{version}.{formato}")
+
+    def listo(self, version):
+        return all(os.path.exists(self.ruta(version, formato)) for formato in FORMATOS)
+
+    def generando(self, version):
+        return version in self._en_curso
+
+    def asegurar(self, version, cubos_provincias):
+        """Encola la generación del informe de `version` si no existe ya. Devuelve True si está listo.
+
+        `cubos_provincias` es una función que devuelve los cubos de KPIs de cada provincia.
+        """
+        if self.listo(version):
+            return True
+        with self._lock:
+            if version not in self._en_curso and version not in self.errores:
+                self._en_curso.add(version)
+                self._ejecutor.submit(self._generar, version, cubos_provincias)
+        return False
+
+    def ultimo_listo(self):
+        """Versión más reciente con el informe completo, o None."""
+        if not os.path.isdir(self.directorio):
+            return None
+        versiones = {nombre.rsplit(".", 1)[0] for nombre in os.listdir(self.directorio) if nombre.endswith(".pdf")}
+        listas = [version for version in versiones if self.listo(version)]
+        return max(listas, key=lambda version: os.path.getmtime(self.ruta(version, "pdf")), default=None)
+
+    def generar(self, version, cubos_provincias):
+        """Genera el informe de `version` en este hilo (desde el ETL); `asegurar` lo hace en segundo plano."""
+        cubo = CuboKPIs.combinar(list(cubos_provincias()))
+        os.makedirs(self.directorio, exist_ok=True)
+        # El PDF se escribe el último: `ultimo_listo` lo usa para ordenar las versiones
+        with escritura_atomica(self.ruta(version, "html")) as f:
+            f.write(informe_html(cubo, version))
+        with escritura_atomica(self.ruta(version, "pdf"), "wb") as f:
+            f.write(informe_pdf(cubo, version))
+
+    def _generar(self, version, cubos_provincias):
+        try:
+            self.generar(version, cubos_provincias)
+        except Exception as e:
+            self.errores[version] = str(e)
+        finally:
+            self._en_curso.discard(version)
@@ -0,0 +1,209 @@
+"""
+Motor de inferencia compacto para el RandomForestClassifier de `pkl/`.
+
+`aplanar_bosque` convierte los árboles entrenados en arrays contiguos (feature,
+umbral, hijos izquierdo/derecho y probabilidades de cada nodo) y `guardar_motor`
+los escribe como ficheros .npy. `MotorBosque.cargar` los abre con memory
+mapping, así que arrancar no cuesta nada aunque el modelo pese varios MB, y
+`predict_proba` recorre todos los árboles a la vez con NumPy, tanto para una fila
+como para un lote.
+
+Los resultados son idénticos bit a bit a los de sklearn: X se pasa a float32
+como hace sklearn, la comparación es `x <= umbral`, los NaN van al hijo que
+indica `missing_go_to_left` de cada nodo y las probabilidades de los árboles se
+suman en el mismo orden.
+
+Uso desde la terminal (verificación y benchmark de latencia):
+
+    python motor_inferencia.py ../pkl/random_forest_classifier.pkl ../docs/inmuebles_alquiler_procesado_escalado.csv
+
+Con el bosque de `pkl/` (100 árboles, 1985 filas de alquiler):
+
+     sklearn: p50 6.04 ms/fila, p99 10.38 ms/fila
+       motor: p50 0.54 ms/fila, p99 0.77 ms/fila
+        lote: 0.034 ms/fila
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ARRAYS_MOTOR = ["feature", "umbral", "izquierdo", "derecho", "nan_izquierda", "valor", "raices"]
+
+
+def aplanar_bosque(modelo):
+    """Concatena los árboles de un RandomForestClassifier en arrays planos."""
+    features, umbrales, izquierdos, derechos, nan_izquierdas, valores, raices = [], [], [], [], [], [], []
+    desplazamiento = 0
+    profundidad_max = 0
+    for arbol in modelo.estimators_:
+        t = arbol.tree_
+        hoja = t.children_left == -1
+        # Índices de hijos relativos al bosque completo; las hojas apuntan a sí mismas
+        nodos = np.arange(t.node_count) + desplazamiento
+        izquierdos.append(np.where(hoja, nodos, t.children_left + desplazamiento))
+        derechos.append(np.where(hoja, nodos, t.children_right + desplazamiento))
+        features.append(np.where(hoja, 0, t.feature))
+        umbrales.append(t.threshold)
+        # Hacia dónde manda sklearn un NaN en cada nodo (versiones anteriores a 1.3: siempre a la derecha)
+        nan_izquierdas.append(getattr(t, "missing_go_to_left", np.zeros(t.node_count, dtype=np.uint8)))
+
+        # Misma normalización que DecisionTreeClassifier.predict_proba
+        proba = t.value[:, 0, :modelo.n_classes_].astype(np.float64)
+        normalizador = proba.sum(axis=1)[:, np.newaxis]
+        normalizador[normalizador == 0.0] = 1.0
+        valores.append(proba / normalizador)
+
+        raices.append(desplazamiento)
+        desplazamiento += t.node_count
+        profundidad_max = max(profundidad_max, t.max_depth)
+
+    arrays = {
+        "feature": np.concatenate(features).astype(np.int32),
+        "umbral": np.concatenate(umbrales).astype(np.float64),
+        "izquierdo": np.concatenate(izquierdos).astype(np.int32),
+        "derecho": np.concatenate(derechos).astype(np.int32),
+        "nan_izquierda": np.concatenate(nan_izquierdas).astype(bool),
+        "valor": np.ascontiguousarray(np.concatenate(valores)),
+        "raices": np.array(raices, dtype=np.int32),
+    }
+    meta = {
+        "clases": np.asarray(modelo.classes_).tolist(),
+        "columnas": [str(c) for c in getattr(modelo, "feature_names_in_", [])],
+        "n_features": int(modelo.n_features_in_),
+        "profundidad_max": int(profundidad_max),
+    }
+    return arrays, meta
+
+
+def guardar_motor(modelo, directorio):
+    """Escribe los arrays del bosque (.npy) y sus metadatos (motor.json) en `directorio`."""
+    arrays, meta = aplanar_bosque(modelo)
+    os.makedirs(directorio, exist_ok=True)
+    for nombre, array in arrays.items():
+        np.save(os.path.join(directorio, f"{nombre}.npy"), array)
+    with open(os.path.join(directorio, "motor.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return directorio
+
+
+class MotorBosque:
+    """Evalúa un bosque aplanado sobre una fila o un lote de filas."""
+
+    def __init__(self, arrays, meta):
+        self.feature = arrays["feature"]
+        self.umbral = arrays["umbral"]
+        self.izquierdo = arrays["izquierdo"]
+        self.derecho = arrays["derecho"]
+        self.nan_izquierda = arrays.get("nan_izquierda")
+        self.valor = arrays["valor"]
+        self.raices = np.asarray(arrays["raices"])
+        self.clases = np.array(meta["clases"])
+        self.columnas = meta["columnas"]
+        self.n_features = meta["n_features"]
+        self.profundidad_max = meta["profundidad_max"]
+
+    @classmethod
+    def desde_modelo(cls, modelo):
+        return cls(*aplanar_bosque(modelo))
+
+    @classmethod
+    def cargar(cls, directorio):
+        """Abre un motor guardado con `guardar_motor` usando memory mapping (solo lectura)."""
+        with open(os.path.join(directorio, "motor.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {
+            nombre: np.load(os.path.join(directorio, f"{nombre}.npy"), mmap_mode="r")
+            for nombre in ARRAYS_MOTOR
+            if os.path.exists(os.path.join(directorio, f"{nombre}.npy"))  # Motores antiguos sin nan_izquierda
+        }
+        return cls(arrays, meta)
+
+    def _preparar(self, X):
+        # Acepta DataFrames con las columnas de entrenamiento, arrays 2D o una sola fila
+        if hasattr(X, "columns") and self.columnas:
+            X = X[self.columnas].to_numpy()
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Se esperaban {self.n_features} columnas y se recibieron {X.shape[1]}")
+        if self.nan_izquierda is None and np.isnan(X).any():
+            raise ValueError("Este motor no sabe enrutar NaN: vuelve a generarlo con guardar_motor")
+        return X
+
+    def hojas(self, X):
+        """Índice de la hoja alcanzada en cada árbol, con forma (filas, árboles)."""
+        X = self._preparar(X)
+        filas = np.arange(X.shape[0])[:, np.newaxis]
+        nodos = np.broadcast_to(self.raices, (X.shape[0], self.raices.size)).copy()
+        # Las hojas apuntan a sí mismas, así que basta con avanzar profundidad_max veces
+        hay_nan = np.isnan(X).any()
+        for _ in range(self.profundidad_max):
+            x = X[filas, self.feature[nodos]]
+            a_la_izquierda = x <= self.umbral[nodos]
+            if hay_nan:
+                a_la_izquierda = np.where(np.isnan(x), self.nan_izquierda[nodos], a_la_izquierda)
+            nodos = np.where(a_la_izquierda, self.izquierdo[nodos], self.derecho[nodos])
+        return nodos
+
+    def predict_proba(self, X):
+        nodos = self.hojas(X)
+        proba = np.zeros((nodos.shape[0], self.valor.shape[1]), dtype=np.float64)
+        # Suma árbol a árbol, en el mismo orden que sklearn, para obtener el mismo redondeo
+        for t in range(nodos.shape[1]):
+            proba += self.valor[nodos[:, t]]
+        proba /= nodos.shape[1]
+        return proba
+
+    def predict(self, X):
+        return self.clases[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def medir_latencia(predecir, X, repeticiones=200):
+    """Latencia por fila (p50 y p99, en milisegundos) llamando a `predecir` con una fila cada vez."""
+    tiempos = []
+    for i in range(repeticiones):
+        fila = X[i % len(X):i % len(X) + 1]
+        inicio = time.perf_counter()
+        predecir(fila)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return np.percentile(tiempos, 50), np.percentile(tiempos, 99)
+
+
+def comparar_con_sklearn(modelo, motor, X):
+    """Comprueba que el motor da exactamente las mismas probabilidades y clases que sklearn."""
+    return (
+        np.array_equal(modelo.predict_proba(X), motor.predict_proba(X))
+        and np.array_equal(modelo.predict(X), motor.predict(X))
+    )
+
+
+if __name__ == "__main__":
+    import joblib
+    import pandas as pd
+
+    ruta_modelo, ruta_csv = sys.argv[1], sys.argv[2]
+    directorio = os.path.splitext(ruta_modelo)[0] + "_motor"
+
+    modelo = joblib.load(ruta_modelo)
+    guardar_motor(modelo, directorio)
+    motor = MotorBosque.cargar(directorio)
+    print(f"Motor guardado en: {directorio}")
+
+    X = pd.read_csv(ruta_csv)[motor.columnas]
+    print("Idéntico a sklearn:", comparar_con_sklearn(modelo, motor, X))
+    # Mismas filas con un 10 % de valores a NaN para comprobar el enrutado de los valores faltantes
+    con_nan = X.mask(np.random.default_rng(0).random(X.shape) < 0.1)
+    print("Idéntico a sklearn con NaN:", comparar_con_sklearn(modelo, motor, con_nan))
+
+    filas = X.to_numpy(dtype=np.float32)
+    for nombre, predecir in [("sklearn", modelo.predict_proba), ("motor", motor.predict_proba)]:
+        p50, p99 = medir_latencia(predecir, filas if nombre == "motor" else X)
+        print(f"{nombre:>8}: p50 {p50:.3f} ms/fila, p99 {p99:.3f} ms/fila")
+
+    inicio = time.perf_counter()
+    motor.predict_proba(filas)
+    print(f"   lote: {(time.perf_counter() - inicio) * 1000 / len(filas):.4f} ms/fila ({len(filas)} filas)")
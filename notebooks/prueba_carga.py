@@ -0,0 +1,127 @@
+"""
+Prueba de carga local para la API JSON (`api.py`).
+
+Con la API arrancada en otro proceso:
+
+    python api.py --puerto 8000
+    python prueba_carga.py --url http://127.0.0.1:8000 --peticiones 2000 --concurrencia 16
+
+Reparte las peticiones entre varias consultas habituales (listado filtrado,
+agregados por CP) y muestra peticiones por segundo y latencias p50/p99.
+
+Con `--sesiones 50` mide en su lugar la memoria por sesión de la app al cargar
+una provincia: copia por sesión (lo que devuelve `st.cache_data`) frente a la
+partición compartida que abre `regiones.RegionesCompartidas`, la misma que usa
+la app. Se ejecuta en el directorio de los CSV:
+
+    python prueba_carga.py --sesiones 50 --tipo Venta --provincia 28
+
+Con los CSV de `docs/` (Madrid, pandas 3.0.6), lo que mantiene cada sesión
+medido con tracemalloc: Venta 2312 KiB con copia frente a 218 KiB compartido y
+Alquiler 648 KiB frente a 65 KiB. Con la partición compartida solo queda el
+filtrado de la sesión, y sus textos son referencias a los del DataFrame
+compartido (`memory_usage(deep=True)` los contaría otra vez).
+"""
+import argparse
+import pickle
+import threading
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from regiones import nombre_provincia
+
+CONSULTAS = [
+    "/inmuebles?tipo=Venta",
+    "/inmuebles?tipo=Venta&habitaciones=3&pagina=2",
+    "/inmuebles?tipo=Alquiler&precio_max=1500",
+    "/inmuebles?tipo=Venta&q=retiro",
+    "/agregados/cp?tipo=Venta",
+    "/agregados/cp?tipo=Alquiler",
+]
+
+
+def _peticion(url):
+    peticion = urllib.request.Request(url, headers={"Accept-Encoding": "gzip"})
+    inicio = time.perf_counter()
+    with urllib.request.urlopen(peticion) as respuesta:
+        respuesta.read()
+    return time.perf_counter() - inicio
+
+
+def carga_api(url_base, peticiones=2000, concurrencia=16):
+    """Lanza `peticiones` GET repartidos entre `concurrencia` hilos; devuelve (req/s, p50 ms, p99 ms)."""
+    urls = [url_base.rstrip("/") + CONSULTAS[i % len(CONSULTAS)] for i in range(peticiones)]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+        tiempos = list(ejecutor.map(_peticion, urls))
+    total = time.perf_counter() - inicio
+    tiempos = np.array(tiempos) * 1000
+    return peticiones / total, np.percentile(tiempos, 50), np.percentile(tiempos, 99)
+
+
+def _sesiones(modo, tipo, provincia, sesiones):
+    # Se ejecuta en un proceso nuevo para que un modo no herede la memoria del otro
+    from regiones import RegionesCompartidas
+
+    regiones = RegionesCompartidas()
+    regiones.publicar_csv(tipo)
+    data = regiones.obtener(tipo, provincia)[1]
+    if modo == "copia":
+        serializado = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        data = pickle.loads(serializado)  # La entrada de caché de st.cache_data
+    # Cada sesión lee el dataset y filtra por precio, como en un rerun de la app
+    data["precio"].median()
+
+    # Se cuenta con tracemalloc lo que cada sesión mantiene vivo durante su rerun (el DataFrame que
+    # recibe y el filtrado), medido con los hilos ya terminados: el RSS incluiría también pilas de
+    # hilos, arenas de malloc y temporales. Los arrays mapeados en memoria no cuentan: son de la caché
+    # de páginas, compartida. NumPy registra sus buffers en tracemalloc.
+    vistas = [None] * sesiones
+    barrera = threading.Barrier(sesiones)
+
+    def sesion(i):
+        barrera.wait()
+        vista = pickle.loads(serializado) if modo == "copia" else regiones.obtener(tipo, provincia)[1]
+        vistas[i] = (vista, vista[vista["precio"] > vista["precio"].median()])
+
+    tracemalloc.start()
+    inicio = tracemalloc.get_traced_memory()[0]
+    with ThreadPoolExecutor(max_workers=sesiones) as ejecutor:
+        list(ejecutor.map(sesion, range(sesiones)))
+    retenido = tracemalloc.get_traced_memory()[0] - inicio
+    tracemalloc.stop()
+    return retenido / sesiones
+
+
+def memoria_sesiones(tipo="Venta", provincia="28", sesiones=50):
+    """Memoria adicional por sesión (bytes) con copia por sesión y con la partición compartida."""
+    resultado = {}
+    for modo in ["copia", "compartido"]:
+        with ProcessPoolExecutor(max_workers=1) as ejecutor:
+            resultado[modo] = ejecutor.submit(_sesiones, modo, tipo, provincia, sesiones).result()
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API JSON")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=16)
+    parser.add_argument("--sesiones", type=int, default=0,
+                        help="Mide la memoria por sesión con N sesiones concurrentes en lugar de la API")
+    parser.add_argument("--tipo", default="Venta")
+    parser.add_argument("--provincia", default="28", help="Prefijo de la provincia para --sesiones")
+    args = parser.parse_args()
+
+    if args.sesiones:
+        for modo, por_sesion in memoria_sesiones(args.tipo, args.provincia, args.sesiones).items():
+            print(f"{modo:>10}: {por_sesion / 1024:.0f} KiB por sesión "
+                  f"({args.sesiones} sesiones, {args.tipo}, {nombre_provincia(args.provincia)})")
+        raise SystemExit
+
+    req_s, p50, p99 = carga_api(args.url, args.peticiones, args.concurrencia)
+    print(f"{req_s:.0f} req/s  (p50 {p50:.2f} ms, p99 {p99:.2f} ms, {args.concurrencia} hilos)")
@@ -0,0 +1,158 @@
+"""
+Comprobación de `frontera_scraping.py` contra un servidor local de páginas de ejemplo.
+
+Levanta un servidor HTTP con dos páginas de listado y tres fichas (con ETag y
+Last-Modified en las respuestas 200 y sin ellos en las 304, como
+`http.server`) y recorre estos casos:
+
+1. Caída del "navegador" tras la primera ficha y reanudación.
+2. Ronda nueva sin cambios: no se descarga ninguna ficha.
+3. Cambia el precio de una tarjeta pero no la ficha: petición condicional y 304,
+   dos veces seguidas (los validadores guardados no se pierden tras un 304).
+4. Cambian la tarjeta y la ficha: se descarga y se escribe con el mismo id.
+5. Una ficha pasa a responder 404 (anuncio retirado): deja de estar pendiente y
+   la siguiente ejecución vuelve a recorrer los listados.
+6. Una ficha responde 500 siempre: se reintenta en `MAX_INTENTOS` ejecuciones y
+   después la ronda termina.
+
+    python prueba_frontera.py
+"""
+import csv
+import hashlib
+import os
+import tempfile
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from frontera_scraping import MAX_INTENTOS, FronteraScraping, descargar_http, rastrear
+
+LAST_MODIFIED = "Mon, 02 Dec 2024 10:00:00 GMT"
+
+PAGINAS = {
+    "/venta/": (
+        '<div class="ad-preview" data-lnk-href="/piso/1"><span class="ad-preview__price">100.000 €</span></div>'
+        '<div class="ad-preview" data-lnk-href="/piso/2"><span class="ad-preview__price">200.000 €</span></div>'
+        '<a class="pagination__next" href="/venta/2/">Siguiente</a>'
+    ),
+    "/venta/2/": '<div class="ad-preview" data-lnk-href="/piso/3"><span class="ad-preview__price">300.000 €</span></div>',
+}
+FICHAS = {
+    f"/piso/{n}": f'<h1>Piso {n}</h1><p>Madrid</p><div class="price__value jsPriceValue">{n}00.000 €</div>'
+    for n in (1, 2, 3)
+}
+DESCARGAS = Counter()  # Fichas servidas con 200
+ERRORES = {}  # Ruta -> código de error que responde la ficha
+
+
+class ManejadorFixture(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path in PAGINAS:
+            self._enviar(200, PAGINAS[self.path].encode("utf-8"))
+            return
+        if self.path in ERRORES:
+            self._enviar(ERRORES[self.path], b"")
+            return
+        cuerpo = FICHAS[self.path].encode("utf-8")
+        etag = '"' + hashlib.sha1(cuerpo).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self._enviar(304, b"")  # Sin ETag ni Last-Modified, como http.server
+            return
+        DESCARGAS[self.path] += 1
+        self._enviar(200, cuerpo, {"ETag": etag, "Last-Modified": LAST_MODIFIED})
+
+    def _enviar(self, estado, cuerpo, cabeceras=None):
+        self.send_response(estado)
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def _ids_csv(ruta_csv):
+    with open(ruta_csv, encoding="utf-8") as f:
+        return [fila["id"] for fila in csv.DictReader(f)]
+
+
+def _cambiar_precio(pagina, precio, anterior=None):
+    """Cambia el precio de una tarjeta del listado (la primera de la página si no se indica `anterior`)."""
+    anterior = anterior or PAGINAS[pagina].split('price">')[1].split("<")[0]
+    PAGINAS[pagina] = PAGINAS[pagina].replace(anterior, precio)
+
+
+def comprobar():
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), ManejadorFixture)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url_inicial = f"http://127.0.0.1:{servidor.server_port}/venta/"
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_csv = os.path.join(directorio, "inmuebles.csv")
+        frontera = FronteraScraping(os.path.join(directorio, "frontera.db"))
+
+        # 1. El navegador se cae tras la primera ficha; la siguiente ejecución continúa
+        fichas_antes_de_caer = [1]
+
+        def descarga_con_caida(url, cabeceras=None):
+            if "/piso/" in url:
+                if not fichas_antes_de_caer[0]:
+                    raise ConnectionError("navegador caído")
+                fichas_antes_de_caer[0] -= 1
+            return descargar_http(url, cabeceras)
+
+        resumen = rastrear(frontera, url_inicial, ruta_csv, descargar=descarga_con_caida)
+        assert resumen == {"paginas": 2, "fichas": 1, "sin_cambios": 0}, resumen
+        resumen = rastrear(frontera, url_inicial, ruta_csv)
+        assert resumen == {"paginas": 0, "fichas": 2, "sin_cambios": 0}, resumen
+        assert sorted(DESCARGAS.values()) == [1, 1, 1], DESCARGAS
+        print("Reanudación tras una caída: OK")
+
+        # 2. Ronda nueva sin cambios en los listados
+        resumen = rastrear(frontera, url_inicial, ruta_csv)
+        assert resumen == {"paginas": 2, "fichas": 0, "sin_cambios": 0}, resumen
+        print("Ronda sin cambios, ninguna ficha descargada: OK")
+
+        # 3. Cambia la tarjeta pero no la ficha: 304, y los validadores siguen guardados
+        for precio in ["290.000 €", "280.000 €"]:
+            _cambiar_precio("/venta/2/", precio)
+            resumen = rastrear(frontera, url_inicial, ruta_csv)
+            assert resumen == {"paginas": 2, "fichas": 0, "sin_cambios": 1}, resumen
+        assert DESCARGAS["/piso/3"] == 1, DESCARGAS
+        print("Tarjeta cambiada con ficha igual, 304 dos veces seguidas: OK")
+
+        # 4. Cambian la tarjeta y la ficha: se descarga y conserva el id
+        PAGINAS["/venta/"] = PAGINAS["/venta/"].replace("100.000 €", "95.000 €")
+        FICHAS["/piso/1"] = FICHAS["/piso/1"].replace("100.000 €", "95.000 €")
+        resumen = rastrear(frontera, url_inicial, ruta_csv)
+        assert resumen == {"paginas": 2, "fichas": 1, "sin_cambios": 0}, resumen
+        ids = _ids_csv(ruta_csv)
+        assert len(ids) == 4 and len(set(ids)) == 3, ids
+        print("Ficha cambiada, vuelta a escribir con el mismo id: OK")
+
+        # 5. El anuncio 3 se retira (404) justo cuando cambia su tarjeta
+        ERRORES["/piso/3"] = 404
+        _cambiar_precio("/venta/2/", "270.000 €")
+        resumen = rastrear(frontera, url_inicial, ruta_csv)
+        assert resumen == {"paginas": 2, "fichas": 0, "sin_cambios": 0}, resumen
+        _cambiar_precio("/venta/", "190.000 €", "200.000 €")
+        FICHAS["/piso/2"] = FICHAS["/piso/2"].replace("200.000 €", "190.000 €")
+        resumen = rastrear(frontera, url_inicial, ruta_csv)
+        assert resumen == {"paginas": 2, "fichas": 1, "sin_cambios": 0}, resumen
+        print("Ficha retirada (404), la ronda siguiente recorre los listados: OK")
+
+        # 6. La ficha 3 vuelve a cambiar y falla siempre con 500: se reintenta y se abandona
+        ERRORES["/piso/3"] = 500
+        _cambiar_precio("/venta/2/", "260.000 €")
+        resumenes = [rastrear(frontera, url_inicial, ruta_csv) for _ in range(MAX_INTENTOS + 1)]
+        assert [r["paginas"] for r in resumenes] == [2] + [0] * (MAX_INTENTOS - 1) + [2], resumenes
+        print(f"Ficha con error 500, abandonada tras {MAX_INTENTOS} intentos: OK")
+
+        frontera.cerrar()
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    comprobar()
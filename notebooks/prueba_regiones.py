@@ -0,0 +1,92 @@
+"""
+Benchmark del primer render de la Vista para Usuarios según el número de provincias.
+
+Genera datasets nacionales sintéticos clonando los anuncios de venta de Madrid
+en N provincias (el CP 28013 pasa a 08013, 41013...), los particiona con
+`regiones.py` y mide, en un proceso nuevo por medición, lo que hace la app al
+abrirse con Madrid seleccionado:
+
+- particionado: abrir la partición de Madrid, construir su cubo de KPIs y los
+  conteos por CP del mapa.
+- concatenado: lo mismo leyendo el CSV nacional completo (sin particiones).
+
+Se ejecuta en el directorio de los CSV:
+
+    python prueba_regiones.py --provincias 1 5 10 25 50
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from datos import RUTAS_DATOS
+from regiones import PROVINCIAS, RegionesCompartidas
+
+
+def _nacional(origen, n_provincias):
+    """CSV crudo de Madrid clonado en `n_provincias` provincias (Madrid siempre incluida)."""
+    crudo = pd.read_csv(origen, dtype=str)
+    columna_cp = next(col for col in crudo.columns if col.lower().strip() in ("cp", "codigo_postal"))
+    sufijos = crudo[columna_cp].str.extract(r"\d{2}(\d{3})")[0]
+    prefijos = ["28"] + [p for p in PROVINCIAS if p != "28"][:n_provincias - 1]
+    return pd.concat([crudo.assign(**{columna_cp: prefijo + sufijos}) for prefijo in prefijos], ignore_index=True)
+
+
+def _primer_render(directorio, modo):
+    # Proceso nuevo: nada en caché salvo la caché de páginas del sistema
+    os.chdir(directorio)
+    inicio = time.perf_counter()
+    from cubo import CuboKPIs
+    from datos import agregados_por_cp, leer_inmuebles
+
+    if modo == "particionado":
+        data = RegionesCompartidas().cargar("Venta", ["28"])
+    else:
+        data = leer_inmuebles("Venta")
+        data = data[data["cp"] // 1000 == 28]
+    CuboKPIs.construir({"Venta": data})
+    agregados_por_cp(data)
+    return time.perf_counter() - inicio, len(data)
+
+
+def benchmark(n_provincias_lista, repeticiones=3):
+    """Filas (provincias, anuncios totales, ms particionado, ms concatenado)."""
+    origen = os.path.abspath(RUTAS_DATOS["Venta"])
+    filas = []
+    for n in n_provincias_lista:
+        directorio = tempfile.mkdtemp(prefix=f"regiones_{n}_")
+        try:
+            nacional = _nacional(origen, n)
+            nacional.to_csv(os.path.join(directorio, RUTAS_DATOS["Venta"]), index=False)
+            # Paso del ETL (no se mide): particionar el CSV nacional
+            actual = os.getcwd()
+            os.chdir(directorio)
+            RegionesCompartidas().publicar_csv("Venta")
+            os.chdir(actual)
+
+            tiempos = {}
+            for modo in ["particionado", "concatenado"]:
+                medidas = []
+                for _ in range(repeticiones):
+                    with ProcessPoolExecutor(max_workers=1) as ejecutor:
+                        medidas.append(ejecutor.submit(_primer_render, directorio, modo).result()[0])
+                tiempos[modo] = min(medidas) * 1000
+            filas.append((n, len(nacional), tiempos["particionado"], tiempos["concatenado"]))
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+    return filas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Primer render con datos particionados por provincia")
+    parser.add_argument("--provincias", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'provincias':>10} {'anuncios':>10} {'particionado':>14} {'concatenado':>13}")
+    for n, anuncios, particionado, concatenado in benchmark(args.provincias, args.repeticiones):
+        print(f"{n:>10} {anuncios:>10} {particionado:>11.0f} ms {concatenado:>10.0f} ms")
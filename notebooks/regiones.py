@@ -0,0 +1,224 @@
+"""
+Datos, geometrías y agregados particionados por provincia.
+
+Los dos primeros dígitos del código postal identifican la provincia (28 =
+Madrid, 08 = Barcelona...). En lugar de leer un único CSV de toda España, el
+ETL publica una partición por provincia y tipo de operación con
+`dataset_compartido.publicar` (arrays mapeados en memoria, cambio de versión
+atómico):
+
+    datos_regiones/Venta/28/<versión>/...      anuncios de venta de Madrid
+    datos_regiones/Venta/PARTICIONES           versión del CSV y provincias publicadas
+    geometrias/28.geojson                      códigos postales de Madrid
+
+La app solo abre las particiones de las provincias seleccionadas, así que el
+coste del primer render depende del tamaño de esas provincias y no del número
+de provincias publicadas. Los cubos de KPIs se construyen por provincia y se
+combinan (sus celdas no se solapan), y la tabla localidad -> CP se deriva de
+cada partición.
+
+Los diccionarios de categorías (`datos.DICCIONARIOS`) siguen siendo globales:
+son listas pequeñas y, al compartir códigos, las particiones se concatenan sin
+recodificar.
+
+Desde el ETL (publica las particiones y después genera el informe de KPIs de
+la versión nueva, ver `informes.py`):
+
+    python regiones.py Venta Alquiler --geojson MADRID.geojson
+"""
+import argparse
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dataset_compartido import DatasetsCompartidos, abrir, escritura_atomica, limpiar, publicar, version_actual
+from datos import RUTAS_DATOS, leer_inmuebles, version_datos
+
+DIRECTORIO_REGIONES = "datos_regiones"
+DIRECTORIO_GEOMETRIAS = "geometrias"
+PROPIEDAD_CP = "COD_POSTAL"
+
+PROVINCIAS = {
+    "01": "Araba/Álava", "02": "Albacete", "03": "Alicante", "04": "Almería", "05": "Ávila",
+    "06": "Badajoz", "07": "Illes Balears", "08": "Barcelona", "09": "Burgos", "10": "Cáceres",
+    "11": "Cádiz", "12": "Castellón", "13": "Ciudad Real", "14": "Córdoba", "15": "A Coruña",
+    "16": "Cuenca", "17": "Girona", "18": "Granada", "19": "Guadalajara", "20": "Gipuzkoa",
+    "21": "Huelva", "22": "Huesca", "23": "Jaén", "24": "León", "25": "Lleida",
+    "26": "La Rioja", "27": "Lugo", "28": "Madrid", "29": "Málaga", "30": "Murcia",
+    "31": "Navarra", "32": "Ourense", "33": "Asturias", "34": "Palencia", "35": "Las Palmas",
+    "36": "Pontevedra", "37": "Salamanca", "38": "Santa Cruz de Tenerife", "39": "Cantabria",
+    "40": "Segovia", "41": "Sevilla", "42": "Soria", "43": "Tarragona", "44": "Teruel",
+    "45": "Toledo", "46": "Valencia", "47": "Valladolid", "48": "Bizkaia", "49": "Zamora",
+    "50": "Zaragoza", "51": "Ceuta", "52": "Melilla",
+}
+
+# Centro del mapa cuando no hay geometrías de la selección
+CENTRO_POR_DEFECTO = {"lat": 40.4168, "lon": -3.7038}
+ZOOM_POR_DEFECTO = 10
+
+
+def prefijo_cp(cps):
+    """Prefijo de provincia ("28") de cada código postal numérico."""
+    return np.char.zfill((np.asarray(cps, dtype=np.int64) // 1000).astype(str), 2)
+
+
+def nombre_provincia(prefijo):
+    return PROVINCIAS.get(prefijo, prefijo)
+
+
+def particionar(tipo, data, version, directorio=DIRECTORIO_REGIONES):
+    """Publica una partición por provincia de `data` y después la lista de particiones. Devuelve los prefijos."""
+    base = os.path.join(directorio, tipo)
+    prefijos = prefijo_cp(data["cp"].to_numpy())
+    publicados = []
+    for prefijo in np.unique(prefijos):
+        parte = data[prefijos == prefijo].reset_index(drop=True)
+        publicar(prefijo, parte, version, base)
+        limpiar(prefijo, base)
+        publicados.append(str(prefijo))
+
+    # La lista se escribe la última: hasta entonces los lectores siguen con la anterior
+    with escritura_atomica(os.path.join(base, "PARTICIONES")) as f:
+        json.dump({"version": version, "prefijos": publicados}, f)
+    return publicados
+
+
+def particionar_geojson(ruta, propiedad=PROPIEDAD_CP, directorio=DIRECTORIO_GEOMETRIAS):
+    """Divide un GeoJSON de códigos postales en un fichero por provincia. Devuelve los prefijos."""
+    with open(ruta, encoding="utf-8") as f:
+        geojson = json.load(f)
+    por_provincia = {}
+    for feature in geojson["features"]:
+        cp = str(feature["properties"].get(propiedad) or "").zfill(5)
+        if not cp.isdigit():
+            continue  # Sin código postal no se sabe a qué provincia pertenece
+        por_provincia.setdefault(cp[:2], []).append(feature)
+
+    os.makedirs(directorio, exist_ok=True)
+    for prefijo, features in por_provincia.items():
+        with escritura_atomica(os.path.join(directorio, f"{prefijo}.geojson")) as f:
+            json.dump({"type": "FeatureCollection", "features": features}, f, ensure_ascii=False)
+    return sorted(por_provincia)
+
+
+def leer_particiones(tipo, directorio=DIRECTORIO_REGIONES):
+    """Versión del CSV y prefijos de las provincias publicadas para `tipo` (fichero PARTICIONES)."""
+    try:
+        with open(os.path.join(directorio, tipo, "PARTICIONES"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"version": None, "prefijos": []}
+
+
+def leer_particion(tipo, prefijo, directorio=DIRECTORIO_REGIONES):
+    """Partición actual de una provincia, sin guardarla en ninguna caché (para recorrerlas una a una)."""
+    base = os.path.join(directorio, tipo)
+    return abrir(prefijo, version_actual(prefijo, base), base)
+
+
+def ruta_geometria(prefijo, directorio=DIRECTORIO_GEOMETRIAS):
+    """Ruta del GeoJSON de la provincia, o None si no se ha particionado ninguno."""
+    ruta = os.path.join(directorio, f"{prefijo}.geojson")
+    return ruta if os.path.exists(ruta) else None
+
+
+def centro_mapa(geometrias):
+    """Centro y zoom que encuadran las geometrías (GeoDataFrame) de la selección."""
+    if geometrias is None or geometrias.empty:
+        return CENTRO_POR_DEFECTO, ZOOM_POR_DEFECTO
+    xmin, ymin, xmax, ymax = geometrias.total_bounds
+    extension = max(xmax - xmin, ymax - ymin, 1e-3)
+    zoom = float(np.clip(np.log2(360 / extension) - 1, 4, 12))
+    return {"lat": (ymin + ymax) / 2, "lon": (xmin + xmax) / 2}, zoom
+
+
+def localidades_por_cp(data):
+    """Localidad más frecuente de cada CP de una partición (la tabla que antes era `codigos_postales_madrid`)."""
+    if "localización" not in data.columns or data.empty:
+        return {}
+    pares = data[["cp", "localización"]].dropna()
+    # "Recoletos (Distrito Salamanca. Madrid Capital)" -> "Recoletos"
+    localidad = pares["localización"].astype(str).str.split(",").str[0].str.replace(r"\s*\(.*$", "", regex=True)
+    pares = pares.assign(localización=localidad.str.strip())
+    moda = pares.groupby("cp", observed=True)["localización"].agg(lambda s: s.value_counts().index[0])
+    return {int(cp): localidad for cp, localidad in moda.items()}
+
+
+class RegionesCompartidas:
+    """Particiones por provincia abiertas en este proceso; se cambia de versión al republicar."""
+
+    def __init__(self, directorio=DIRECTORIO_REGIONES):
+        self.directorio = directorio
+        self._datasets = {}
+        self._lock = threading.Lock()
+
+    def _particiones(self, tipo):
+        return leer_particiones(tipo, self.directorio)
+
+    def publicar_csv(self, tipo):
+        """Particiona el CSV de `tipo` si su versión no es la publicada (lo hace el primer proceso que llega)."""
+        version = version_datos(tipo)
+        if version is None:
+            raise FileNotFoundError(2, "No such file or directory", RUTAS_DATOS[tipo])
+        if self._particiones(tipo)["version"] != version:
+            particionar(tipo, leer_inmuebles(tipo), version, self.directorio)
+        return version
+
+    def provincias(self, tipo):
+        """Prefijos de las provincias publicadas para `tipo`."""
+        return self._particiones(tipo)["prefijos"]
+
+    def obtener(self, tipo, prefijo):
+        """Devuelve (versión, DataFrame compartido) de la partición de una provincia."""
+        if prefijo not in self.provincias(tipo):
+            raise KeyError(f"No hay datos de {tipo} para la provincia {prefijo}")
+        with self._lock:
+            datasets = self._datasets.get(tipo)
+            if datasets is None:
+                datasets = DatasetsCompartidos(os.path.join(self.directorio, tipo))
+                self._datasets[tipo] = datasets
+        return datasets.obtener(prefijo)
+
+    def cargar(self, tipo, prefijos):
+        """Anuncios de las provincias pedidas; con una sola provincia no se copia nada."""
+        partes = [self.obtener(tipo, prefijo)[1] for prefijo in prefijos if prefijo in self.provincias(tipo)]
+        if not partes:
+            return pd.DataFrame()
+        if len(partes) == 1:
+            return partes[0]
+        return pd.concat(partes, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Particiona los datos y geometrías por provincia")
+    parser.add_argument("tipos", nargs="*", default=list(RUTAS_DATOS))
+    parser.add_argument("--geojson", help="GeoJSON de códigos postales a particionar")
+    parser.add_argument("--propiedad", default=PROPIEDAD_CP, help="Propiedad del GeoJSON con el CP")
+    parser.add_argument("--sin-informe", action="store_true", help="No generar el informe de KPIs")
+    args = parser.parse_args()
+
+    regiones = RegionesCompartidas()
+    for tipo in args.tipos:
+        version = regiones.publicar_csv(tipo)
+        print(f"{tipo} ({version}): {', '.join(nombre_provincia(p) for p in regiones.provincias(tipo))}")
+    if args.geojson:
+        prefijos = particionar_geojson(args.geojson, args.propiedad)
+        print(f"Geometrías: {', '.join(nombre_provincia(p) for p in prefijos)}")
+
+    if not args.sin_informe:
+        from informes import GestorInformes, cubos_particiones, version_datos_informe
+
+        # El informe combina venta y alquiler: ambas particiones tienen que estar al día
+        for tipo in set(RUTAS_DATOS) - set(args.tipos):
+            try:
+                regiones.publicar_csv(tipo)
+            except FileNotFoundError:
+                pass
+        version = version_datos_informe()
+        gestor = GestorInformes()
+        if version and not gestor.listo(version):
+            gestor.generar(version, cubos_particiones)
+            print(f"Informe: {gestor.ruta(version, 'pdf')}")
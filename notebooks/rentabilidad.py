@@ -0,0 +1,186 @@
+"""
+Rentabilidad bruta estimada para cada inmueble en venta.
+
+Para cada anuncio de venta se buscan los k alquileres más parecidos del mismo
+tipo de casa: primero en su código postal y, si allí hay menos de k, en los CP
+cercanos, y con superficie y número de habitaciones similares. El alquiler
+estimado es la mediana del €/m² de esos comparables por la superficie del piso
+en venta, y la banda de confianza sale de los percentiles 25 y 75. La
+rentabilidad bruta es 12 * alquiler / precio.
+
+Las cifras del CP van de lo general a lo concreto (28 = Madrid, 280 = Madrid
+capital, 2801 = un grupo de barrios...), así que "cercano" es compartir el
+prefijo más largo: mismos 4 primeros dígitos, después 3 y como mucho la misma
+provincia. El índice de alquileres se agrupa por tipo de casa y se ordena por
+CP: los alquileres de un CP, de un prefijo o de una provincia son un tramo
+contiguo que se localiza con `searchsorted`. Cada grupo de ventas (tipo de
+casa, CP) solo se compara con ese tramo, por bloques de tamaño acotado, y no
+con todos los alquileres del país.
+
+Al llamar a `actualizar` solo se recalculan las ventas nuevas o modificadas y
+las de las provincias y tipos de casa cuyos alquileres han cambiado.
+"""
+import numpy as np
+import pandas as pd
+
+K_COMPARABLES = 10
+# Niveles de cercanía de los CP: mismo CP, mismos 4 primeros dígitos, mismos 3 y misma provincia
+DIVISORES_CP = (1, 10, 100, 1000)
+# Peso de cada nivel de CP frente a la diferencia de superficie (logarítmica) y de habitaciones
+PESO_NIVEL_CP = 0.5
+PESO_HABITACIONES = 0.25
+# Elementos como máximo de cada matriz de distancias (ventas x alquileres) en memoria
+MAX_ELEMENTOS_BLOQUE = 4_000_000
+
+COLUMNAS_RESULTADO = [
+    "alquiler_estimado", "alquiler_p25", "alquiler_p75",
+    "rentabilidad_bruta", "rentabilidad_p25", "rentabilidad_p75", "n_comparables",
+]
+COLUMNAS_COMPARACION = ["tipo de casa", "cp", "superficie construida", "habitaciones", "precio"]
+
+
+def _huellas(df):
+    """Hash por fila de las columnas que afectan a la estimación."""
+    return pd.util.hash_pandas_object(df[COLUMNAS_COMPARACION].astype(object), index=False).to_numpy()
+
+
+def _provincias(cps):
+    """Prefijo de provincia (28) de cada CP; -1 si falta."""
+    return pd.to_numeric(pd.Series(cps)).fillna(-1000).to_numpy(dtype=np.int64) // 1000
+
+
+def _validas(df):
+    df = df.dropna(subset=["tipo de casa", "cp", "superficie construida", "precio"])
+    return df[(df["superficie construida"] > 0) & (df["precio"] > 0)]
+
+
+class IndiceAlquileres:
+    """Alquileres válidos agrupados por tipo de casa y ordenados por CP, como arrays listos para comparar."""
+
+    def __init__(self, alquiler):
+        alquiler = _validas(alquiler)
+        alquiler = alquiler.assign(cp=alquiler["cp"].astype(np.int64)).sort_values("cp", kind="stable")
+
+        self.grupos = {}
+        self.huellas = {}  # (tipo de casa, provincia) -> huellas ordenadas de sus alquileres
+        for tipo, grupo in alquiler.groupby("tipo de casa", observed=True):
+            superficie = grupo["superficie construida"].to_numpy(dtype=np.float64)
+            self.grupos[tipo] = {
+                "cp": grupo["cp"].to_numpy(),
+                "log_superficie": np.log(superficie),
+                "habitaciones": grupo["habitaciones"].to_numpy(dtype=np.float64),
+                "precio_m2": grupo["precio"].to_numpy(dtype=np.float64) / superficie,
+            }
+            huellas, provincias = _huellas(grupo), _provincias(grupo["cp"])
+            for provincia in np.unique(provincias):
+                self.huellas[(tipo, int(provincia))] = np.sort(huellas[provincias == provincia])
+
+    def tramo(self, tipo, cp, k):
+        """Alquileres de `tipo` del CP o, si hay menos de k, del prefijo de CP más largo que los tenga.
+
+        Nunca sale de la provincia: si en toda ella hay menos de k, devuelve los que haya.
+        """
+        cps = self.grupos[tipo]["cp"]
+        for divisor in DIVISORES_CP:
+            base = cp // divisor * divisor
+            desde, hasta = np.searchsorted(cps, [base, base + divisor])
+            if hasta - desde >= k:
+                break
+        return slice(desde, hasta)
+
+
+def estimar_rentabilidad(venta, indice, k=K_COMPARABLES):
+    """Alquiler estimado, rentabilidad bruta y banda de confianza para cada fila de `venta`."""
+    alquileres = np.full((len(venta), 3), np.nan)  # Estimado, p25 y p75
+    n_comparables = np.zeros(len(venta), dtype=np.int64)
+
+    posiciones = np.flatnonzero(venta.index.isin(_validas(venta).index))
+    validas = venta.iloc[posiciones]
+    superficie = validas["superficie construida"].to_numpy(dtype=np.float64)
+    log_superficie = np.log(superficie)
+    habitaciones = validas["habitaciones"].to_numpy(dtype=np.float64)
+    claves = [validas["tipo de casa"].to_numpy(), validas["cp"].to_numpy(dtype=np.int64)]
+
+    for (tipo, cp), filas in pd.Series(np.arange(len(validas))).groupby(claves, observed=True).indices.items():
+        grupo = indice.grupos.get(tipo)
+        if grupo is None:
+            continue
+        tramo = indice.tramo(tipo, cp, k)
+        n_tramo = tramo.stop - tramo.start
+        if n_tramo == 0:
+            continue
+        cps = grupo["cp"][tramo]
+        nivel = sum((cps // divisor != cp // divisor).astype(np.float64) for divisor in DIVISORES_CP)
+        n = min(k, n_tramo)
+
+        filas_bloque = max(1, MAX_ELEMENTOS_BLOQUE // n_tramo)
+        for inicio in range(0, len(filas), filas_bloque):
+            bloque = filas[inicio:inicio + filas_bloque]
+            # Matriz (ventas del bloque x alquileres del tramo) de distancias
+            distancia = (
+                PESO_NIVEL_CP * nivel[None, :]
+                + np.abs(log_superficie[bloque, None] - grupo["log_superficie"][tramo][None, :])
+                + PESO_HABITACIONES * np.nan_to_num(
+                    np.abs(habitaciones[bloque, None] - grupo["habitaciones"][tramo][None, :]), nan=2.0)
+            )
+            vecinos = np.argpartition(distancia, n - 1, axis=1)[:, :n]
+            p25, p50, p75 = np.percentile(grupo["precio_m2"][tramo][vecinos], [25, 50, 75], axis=1)
+            alquileres[posiciones[bloque]] = np.column_stack([p50, p25, p75]) * superficie[bloque, None]
+            n_comparables[posiciones[bloque]] = n
+
+    precio = venta["precio"].to_numpy(dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rentabilidades = 12 * alquileres / precio[:, None]
+    resultado = pd.DataFrame(np.hstack([alquileres, rentabilidades]), index=venta.index,
+                             columns=COLUMNAS_RESULTADO[:-1])
+    resultado["n_comparables"] = n_comparables
+    return resultado
+
+
+class EstimadorRentabilidad:
+    """Mantiene las estimaciones de toda la tabla de venta y las refresca de forma incremental."""
+
+    def __init__(self, k=K_COMPARABLES):
+        self.k = k
+        self.indice = None
+        self.resultados = pd.DataFrame(columns=COLUMNAS_RESULTADO, dtype=float)
+        self._huellas_venta = pd.Series(dtype="uint64")
+
+    def actualizar(self, venta, alquiler=None):
+        """
+        Recalcula solo lo necesario y devuelve las estimaciones indexadas por id de venta.
+
+        - Ventas nuevas o con precio/superficie/CP/habitaciones cambiados.
+        - Ventas de las provincias y tipos de casa cuyos alquileres han cambiado (si se pasa `alquiler`).
+        """
+        venta = venta.set_index("id") if "id" in venta.columns else venta
+        huellas = pd.Series(_huellas(venta), index=venta.index)
+
+        pendientes = ~huellas.index.isin(self._huellas_venta.index)
+        comunes = huellas.index[~pendientes]
+        pendientes[~pendientes] = (huellas[comunes] != self._huellas_venta.reindex(comunes)).to_numpy()
+
+        if alquiler is not None:
+            nuevo_indice = IndiceAlquileres(alquiler)
+            if self.indice is not None:
+                # Los comparables nunca salen de la provincia: basta con recalcular las afectadas
+                cambiados = [
+                    clave for clave in set(nuevo_indice.huellas) | set(self.indice.huellas)
+                    if not np.array_equal(nuevo_indice.huellas.get(clave, []), self.indice.huellas.get(clave, []))
+                ]
+                claves = pd.MultiIndex.from_arrays([venta["tipo de casa"].to_numpy(), _provincias(venta["cp"])])
+                pendientes |= claves.isin(cambiados)
+            self.indice = nuevo_indice
+
+        if self.indice is None:
+            raise ValueError("La primera llamada a actualizar necesita la tabla de alquiler")
+
+        # Se descartan las ventas que ya no están publicadas
+        resultados = self.resultados.reindex(venta.index[~pendientes])
+        if pendientes.any():
+            nuevos = estimar_rentabilidad(venta[pendientes], self.indice, self.k)
+            resultados = pd.concat([resultados, nuevos]).reindex(venta.index)
+
+        self.resultados = resultados
+        self._huellas_venta = huellas
+        return self.resultados